@@ -15,6 +15,11 @@ from alembic import context
 from app.db.database import Base, DATABASE_URL
 from app.models.user import User  # noqa: F401 - register model with Base
 from app.models.message import Message  # noqa: F401 - register model with Base
+from app.models.read_receipt import ReadReceipt  # noqa: F401 - register model with Base
+from app.models.media import MediaObject  # noqa: F401 - register model with Base
+from app.models.token_revocation import TokenRevocation  # noqa: F401 - register model with Base
+from app.models.presence import UserPresence  # noqa: F401 - register model with Base
+from app.models.change_version import ChangeVersion  # noqa: F401 - register model with Base
 
 config = context.config
 if config.config_file_name is not None:
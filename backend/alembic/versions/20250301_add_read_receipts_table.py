@@ -0,0 +1,43 @@
+"""Add read_receipts table for coalesced read state per conversation
+
+Revision ID: 20250301_reads
+Revises: 20250228_media
+Create Date: 2025-03-01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision: str = "20250301_reads"
+down_revision: Union[str, None] = "20250228_media"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "read_receipts" in inspector.get_table_names():
+        return  # Table already exists (e.g. created by create_all); skip
+    op.create_table(
+        "read_receipts",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("peer_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("last_read_message_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.UniqueConstraint("user_id", "peer_id", name="uq_read_receipts_user_peer"),
+    )
+    op.create_index("ix_read_receipts_user_id", "read_receipts", ["user_id"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "read_receipts" not in inspector.get_table_names():
+        return
+    op.drop_index("ix_read_receipts_user_id", table_name="read_receipts")
+    op.drop_table("read_receipts")
@@ -0,0 +1,42 @@
+"""Add client_msg_id to messages with unique (sender_id, client_msg_id) for idempotent sends
+
+Revision ID: 20250302_client_msg_id
+Revises: 20250301_reads
+Create Date: 2025-03-02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision: str = "20250302_client_msg_id"
+down_revision: Union[str, None] = "20250301_reads"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [c["name"] for c in inspector.get_columns("messages")]
+    if "client_msg_id" not in columns:
+        op.add_column("messages", sa.Column("client_msg_id", sa.String(64), nullable=True))
+    constraints = [c["name"] for c in inspector.get_unique_constraints("messages")]
+    if "uq_messages_sender_client_msg_id" not in constraints:
+        # NULL client_msg_id (legacy rows, clients that don't send one) never conflicts
+        op.create_unique_constraint(
+            "uq_messages_sender_client_msg_id", "messages", ["sender_id", "client_msg_id"]
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    constraints = [c["name"] for c in inspector.get_unique_constraints("messages")]
+    if "uq_messages_sender_client_msg_id" in constraints:
+        op.drop_constraint("uq_messages_sender_client_msg_id", "messages", type_="unique")
+    columns = [c["name"] for c in inspector.get_columns("messages")]
+    if "client_msg_id" in columns:
+        op.drop_column("messages", "client_msg_id")
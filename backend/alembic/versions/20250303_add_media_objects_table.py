@@ -0,0 +1,46 @@
+"""Add media_objects table for storage-backed uploads
+
+Revision ID: 20250303_media_objects
+Revises: 20250302_client_msg_id
+Create Date: 2025-03-03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision: str = "20250303_media_objects"
+down_revision: Union[str, None] = "20250302_client_msg_id"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "media_objects" in inspector.get_table_names():
+        return  # Table already exists (e.g. created by create_all); skip
+    op.create_table(
+        "media_objects",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("key", sa.String(128), nullable=False),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("content_type", sa.String(64), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=True),
+        sa.Column("status", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_media_objects_key", "media_objects", ["key"], unique=True)
+    op.create_index("ix_media_objects_owner_id", "media_objects", ["owner_id"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "media_objects" not in inspector.get_table_names():
+        return
+    op.drop_index("ix_media_objects_owner_id", table_name="media_objects")
+    op.drop_index("ix_media_objects_key", table_name="media_objects")
+    op.drop_table("media_objects")
@@ -0,0 +1,45 @@
+"""Add token_revocations table for logout and session revocation
+
+Revision ID: 20250304_revocations
+Revises: 20250303_media_objects
+Create Date: 2025-03-04
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision: str = "20250304_revocations"
+down_revision: Union[str, None] = "20250303_media_objects"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "token_revocations" in inspector.get_table_names():
+        return  # Table already exists (e.g. created by create_all); skip
+    op.create_table(
+        "token_revocations",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("jti", sa.String(64), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("not_before", sa.Float(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_token_revocations_user_id", "token_revocations", ["user_id"], unique=False)
+    op.create_index("ix_token_revocations_expires_at", "token_revocations", ["expires_at"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "token_revocations" not in inspector.get_table_names():
+        return
+    op.drop_index("ix_token_revocations_expires_at", table_name="token_revocations")
+    op.drop_index("ix_token_revocations_user_id", table_name="token_revocations")
+    op.drop_table("token_revocations")
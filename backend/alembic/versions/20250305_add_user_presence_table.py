@@ -0,0 +1,42 @@
+"""Add user_presence table for cross-worker online state
+
+Revision ID: 20250305_presence
+Revises: 20250304_revocations
+Create Date: 2025-03-05
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision: str = "20250305_presence"
+down_revision: Union[str, None] = "20250304_revocations"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "user_presence" in inspector.get_table_names():
+        return  # Table already exists (e.g. created by create_all); skip
+    op.create_table(
+        "user_presence",
+        sa.Column("worker_id", sa.String(32), primary_key=True),
+        sa.Column("user_id", sa.Integer(), primary_key=True),
+        sa.Column("seen_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_user_presence_user_id", "user_presence", ["user_id"], unique=False)
+    op.create_index("ix_user_presence_seen_at", "user_presence", ["seen_at"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "user_presence" not in inspector.get_table_names():
+        return
+    op.drop_index("ix_user_presence_seen_at", table_name="user_presence")
+    op.drop_index("ix_user_presence_user_id", table_name="user_presence")
+    op.drop_table("user_presence")
@@ -0,0 +1,41 @@
+"""Add content_compressed and content_codec to messages for compressed bodies at rest
+
+Revision ID: 20250306_content_codec
+Revises: 20250305_presence
+Create Date: 2025-03-06
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision: str = "20250306_content_codec"
+down_revision: Union[str, None] = "20250305_presence"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [c["name"] for c in inspector.get_columns("messages")]
+    if "content_compressed" not in columns:
+        op.add_column("messages", sa.Column("content_compressed", sa.LargeBinary(), nullable=True))
+        if bind.dialect.name == "postgresql":
+            # Already zstd-compressed: let TOAST store it out of line without trying pglz on top
+            op.execute("ALTER TABLE messages ALTER COLUMN content_compressed SET STORAGE EXTERNAL")
+    if "content_codec" not in columns:
+        op.add_column("messages", sa.Column("content_codec", sa.String(16), nullable=True))
+
+
+def downgrade() -> None:
+    # Run "python -m app.cli recompress-messages --decompress" first, or compressed bodies are lost
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [c["name"] for c in inspector.get_columns("messages")]
+    if "content_codec" in columns:
+        op.drop_column("messages", "content_codec")
+    if "content_compressed" in columns:
+        op.drop_column("messages", "content_compressed")
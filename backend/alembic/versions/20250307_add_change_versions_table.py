@@ -0,0 +1,37 @@
+"""Add change_versions table for ETag counters shared across workers
+
+Revision ID: 20250307_change_versions
+Revises: 20250306_content_codec
+Create Date: 2025-03-07
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision: str = "20250307_change_versions"
+down_revision: Union[str, None] = "20250306_content_codec"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "change_versions" in inspector.get_table_names():
+        return  # Table already exists (e.g. created by create_all); skip
+    op.create_table(
+        "change_versions",
+        sa.Column("scope", sa.String(64), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "change_versions" not in inspector.get_table_names():
+        return
+    op.drop_table("change_versions")
@@ -0,0 +1,120 @@
+"""
+Command-line tools. Run from backend:
+
+    python -m app.cli export-messages --format ndjson --output messages.ndjson [--user-id 1]
+    python -m app.cli import-messages --format ndjson messages.ndjson
+    python -m app.cli rebalance-messages --from-urls OLD_URL_1,OLD_URL_2 [--dry-run]
+    python -m app.cli recompress-messages [--all | --decompress] [--pause 0.05]
+    python -m app.cli train-compression-dict [--samples 20000] [--size 112640]
+
+Export streams from a server-side cursor; import loads in batches (COPY on PostgreSQL, multi-row
+INSERT elsewhere) and skips messages already present (same sender and client_msg_id), so it can be
+re-run after an interruption. Message ids are not carried over: the target database assigns new ones.
+Import and rebalance route each conversation to its shard per MESSAGE_SHARD_URLS (app.db.shards).
+recompress-messages applies the MESSAGE_COMPRESSION_* settings to existing rows (app.db.compression).
+"""
+import argparse
+import sys
+
+from app.db import message_io
+from app.db.compression import message_codec
+from app.db.database import DATABASE_URL
+from app.db.shards import parse_shard_urls, shards
+
+
+def export_messages(args: argparse.Namespace) -> None:
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output != "-" else sys.stdout
+    try:
+        rows = message_io.iter_messages(args.user_id, args.with_user_id, batch_size=args.batch_size)
+        for chunk in message_io.export_stream(args.format, rows):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def import_messages(args: argparse.Namespace) -> None:
+    src = open(args.input, encoding="utf-8", newline="") if args.input != "-" else sys.stdin
+    try:
+        rows = message_io.read_rows(args.format, src)
+        counts = message_io.import_rows(rows, batch_size=args.batch_size)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+    print(f"Imported {counts['imported']} messages, skipped {counts['skipped']} already present", file=sys.stderr)
+
+
+def rebalance_messages(args: argparse.Namespace) -> None:
+    source_urls = parse_shard_urls(args.from_urls) or [DATABASE_URL]
+    shards.create_tables()
+    moved = message_io.rebalance(source_urls, batch_size=args.batch_size, dry_run=args.dry_run)
+    verb = "Would move" if args.dry_run else "Moved"
+    for url, count in moved.items():
+        print(f"{verb} {count} messages from shard {source_urls.index(url)}", file=sys.stderr)
+
+
+def recompress_messages(args: argparse.Namespace) -> None:
+    counts = message_io.recompress(
+        batch_size=args.batch_size, decompress=args.decompress, all_rows=args.all, pause=args.pause
+    )
+    print(f"Scanned {counts['scanned']} messages, rewrote {counts['changed']}", file=sys.stderr)
+
+
+def train_compression_dict(args: argparse.Namespace) -> None:
+    # Newest messages first: the dictionary should reflect how people write now
+    samples = message_io.sample_contents(args.samples)
+    try:
+        dict_id, path = message_codec.train_dictionary(samples, args.size)
+    except (ValueError, RuntimeError) as e:
+        sys.exit(str(e))
+    print(f"Trained dictionary {dict_id} on {len(samples)} messages: {path}", file=sys.stderr)
+    print(f"Set MESSAGE_COMPRESSION_DICT_ID={dict_id}, then run recompress-messages --all", file=sys.stderr)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export-messages", help="Stream messages to NDJSON/CSV")
+    p.add_argument("--format", choices=message_io.FORMATS, default=message_io.FORMAT_NDJSON)
+    p.add_argument("--output", default="-", help="File path, or - for stdout (default)")
+    p.add_argument("--user-id", type=int, default=None, help="Only messages sent or received by this user")
+    p.add_argument("--with-user-id", type=int, default=None, help="With --user-id: only this conversation")
+    p.add_argument("--batch-size", type=int, default=message_io.DEFAULT_BATCH_SIZE)
+    p.set_defaults(func=export_messages)
+
+    p = sub.add_parser("import-messages", help="Bulk-load messages from an NDJSON/CSV export")
+    p.add_argument("input", help="File path, or - for stdin")
+    p.add_argument("--format", choices=message_io.FORMATS, default=message_io.FORMAT_NDJSON)
+    p.add_argument("--batch-size", type=int, default=message_io.DEFAULT_BATCH_SIZE)
+    p.set_defaults(func=import_messages)
+
+    p = sub.add_parser("rebalance-messages", help="Move messages from an old shard layout to MESSAGE_SHARD_URLS")
+    p.add_argument(
+        "--from-urls",
+        default="",
+        help="Old MESSAGE_SHARD_URLS value (comma-separated, same order); empty = unsharded DATABASE_URL",
+    )
+    p.add_argument("--batch-size", type=int, default=message_io.DEFAULT_BATCH_SIZE)
+    p.add_argument("--dry-run", action="store_true", help="Only count the messages that would move")
+    p.set_defaults(func=rebalance_messages)
+
+    p = sub.add_parser("recompress-messages", help="Compress (or decompress) stored message bodies in batches")
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument("--all", action="store_true", help="Also re-encode already compressed bodies (new dictionary)")
+    mode.add_argument("--decompress", action="store_true", help="Store all bodies as plain text again")
+    p.add_argument("--batch-size", type=int, default=message_io.DEFAULT_BATCH_SIZE)
+    p.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    p.set_defaults(func=recompress_messages)
+
+    p = sub.add_parser("train-compression-dict", help="Train a zstd dictionary on recent message bodies")
+    p.add_argument("--samples", type=int, default=20000, help="Number of recent messages to train on")
+    p.add_argument("--size", type=int, default=112640, help="Dictionary size in bytes")
+    p.set_defaults(func=train_compression_dict)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Event-loop stall detection (opt-in via LOOP_MONITOR_ENABLED).
+
+A background task sleeps for a fixed interval and measures how late it wakes up: that delay is the
+scheduler lag every other coroutine saw. Lag above LOOP_STALL_THRESHOLD_MS counts as a stall.
+
+With LOOP_MONITOR_DEBUG, a watchdog thread also watches the loop while it is blocked and captures the
+loop thread's stack, attributed to the HTTP route or WebSocket handler whose task was running
+(tracked by LoopMonitorMiddleware). Typical culprits: sync DB sessions or file I/O inside async def.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import Counter, deque
+from typing import Deque, Dict, Optional
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Stack frames kept per captured stall, and number of captured stalls kept for /health/ready
+STACK_LIMIT = 30
+RECENT_STALLS = 10
+
+# Running task -> ASGI scope of the request/WebSocket it serves (scope is filled in by routing later)
+_task_scopes: "weakref.WeakKeyDictionary[asyncio.Task, dict]" = weakref.WeakKeyDictionary()
+
+
+def describe_scope(scope: Optional[dict]) -> str:
+    """Human-readable handler label for an ASGI scope, e.g. 'GET /api/v1/messages/' or 'WS /ws/chat'."""
+    if not scope:
+        return "(background)"
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "?")
+    if scope.get("type") == "websocket":
+        return f"WS {path}"
+    return f"{scope.get('method', '?')} {path}"
+
+
+class LoopMonitorMiddleware:
+    """Pure ASGI middleware recording which request/WebSocket each task serves (debug mode only)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            task = asyncio.current_task()
+            if task is not None:
+                _task_scopes[task] = scope
+        await self.app(scope, receive, send)
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, threshold: float, debug: bool):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.stalls_by_handler: Counter = Counter()
+        self.recent_stalls: Deque[Dict] = deque(maxlen=RECENT_STALLS)
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    async def _run(self) -> None:
+        while True:
+            start = time.monotonic()
+            self._last_beat = start
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - start - self.interval)
+            self.last_lag = lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.threshold:
+                self.stalls += 1
+                if not self.debug:
+                    logger.warning("Event loop stalled for %.0f ms", lag * 1000)
+
+    def _watch(self) -> None:
+        """Watchdog thread: while the loop is blocked past the threshold, capture what it is running."""
+        reported_beat = None
+        while not self._stop_event.wait(self.threshold / 2):
+            beat = self._last_beat
+            blocked_for = time.monotonic() - beat - self.interval
+            if blocked_for < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            self._capture(blocked_for)
+
+    def _capture(self, blocked_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=STACK_LIMIT) if frame is not None else []
+        task = asyncio.current_task(self._loop)
+        handler = describe_scope(_task_scopes.get(task)) if task is not None else "(loop callback)"
+        self.stalls_by_handler[handler] += 1
+        self.recent_stalls.append({
+            "handler": handler,
+            "blocked_ms": round(blocked_for * 1000, 1),
+            "at": time.time(),
+            "stack": stack,
+        })
+        logger.warning(
+            "Event loop blocked for >%.0f ms in %s:\n%s", blocked_for * 1000, handler, "".join(stack)
+        )
+
+    def start(self) -> None:
+        """Start measuring (and the watchdog in debug mode). Call from app startup, on the loop."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        if self.debug:
+            self._stop_event.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-monitor-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        stats = {
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "last_lag_ms": round(self.last_lag * 1000, 1),
+            "threshold_ms": round(self.threshold * 1000, 1),
+        }
+        if self.debug:
+            stats["stalls_by_handler"] = dict(self.stalls_by_handler)
+            stats["recent_stalls"] = list(self.recent_stalls)
+        return stats
+
+
+def create_loop_monitor() -> Optional[LoopMonitor]:
+    """LoopMonitor from settings, or None when LOOP_MONITOR_ENABLED is off."""
+    s = get_settings()
+    if not s.LOOP_MONITOR_ENABLED:
+        return None
+    return LoopMonitor(
+        interval=s.LOOP_MONITOR_INTERVAL_MS / 1000,
+        threshold=s.LOOP_STALL_THRESHOLD_MS / 1000,
+        debug=s.LOOP_MONITOR_DEBUG,
+    )
+
+
+loop_monitor = create_loop_monitor()
@@ -0,0 +1,229 @@
+"""
+Access token revocation (logout, password change, deactivation).
+
+Revocations are written to the token_revocations table and mirrored by every worker into a compact
+in-memory denylist, so checking a token is two dict lookups and never a DB hit:
+  - single tokens: 64-bit hash of the jti -> token exp
+  - whole users:   user_id -> (not_before, entry expiry); tokens with iat < not_before are revoked
+A background task pulls rows written by other workers every TOKEN_REVOCATION_SYNC_SECONDS, drops
+entries whose tokens have expired anyway, and closes live /ws/chat sockets using a revoked token.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from app.core.config import get_settings
+from app.db.database import SessionLocal
+from app.models.token_revocation import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+# Close code for sockets whose token was revoked (same as for an invalid token at connect)
+REVOKED_CLOSE_CODE = 1008
+# Delete expired rows from the table every this many syncs
+PURGE_EVERY_SYNCS = 150
+
+
+def _jti_hash(jti: str) -> int:
+    return int.from_bytes(hashlib.blake2b(jti.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _user_id(payload: dict) -> Optional[int]:
+    try:
+        return int(payload.get("sub"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RevocationList:
+    def __init__(self, sync_interval: float, token_ttl: float):
+        self.sync_interval = sync_interval
+        self.token_ttl = token_ttl
+        self._jtis: Dict[int, float] = {}
+        self._users: Dict[int, Tuple[float, float]] = {}
+        self._last_id = 0
+        self._syncs = 0
+        self._sockets: Dict[int, Dict[int, Tuple[WebSocket, dict]]] = {}  # user_id -> id(ws) -> (ws, payload)
+        self._dirty_users: Set[int] = set()
+        self._dirty_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.sockets_closed = 0
+
+    # --- checks (hot path) ---
+
+    def is_revoked(self, payload: dict) -> bool:
+        jti = payload.get("jti")
+        if jti is not None and _jti_hash(str(jti)) in self._jtis:
+            return True
+        user_id = _user_id(payload)
+        entry = self._users.get(user_id) if user_id is not None else None
+        if entry is not None:
+            try:
+                iat = float(payload.get("iat") or 0)
+            except (TypeError, ValueError):
+                iat = 0.0
+            return iat < entry[0]
+        return False
+
+    # --- revoking (called from sync route handlers, i.e. worker threads) ---
+
+    def revoke_token(self, payload: dict) -> None:
+        """Revoke a single token (logout). Tokens without jti can only be revoked via revoke_user."""
+        jti, user_id = payload.get("jti"), _user_id(payload)
+        if jti is None or user_id is None:
+            return
+        exp = float(payload.get("exp") or time.time() + self.token_ttl)
+        self._store(TokenRevocation(jti=str(jti), user_id=user_id, expires_at=datetime.utcfromtimestamp(exp)))
+        self._apply(str(jti), user_id, None, exp)
+
+    def revoke_user(self, user_id: int) -> None:
+        """Revoke every token of a user issued before now (password change, deactivation, deletion)."""
+        now = time.time()
+        expires = now + self.token_ttl
+        self._store(TokenRevocation(user_id=user_id, not_before=now, expires_at=datetime.utcfromtimestamp(expires)))
+        self._apply(None, user_id, now, expires)
+
+    @staticmethod
+    def _store(row: TokenRevocation) -> None:
+        db = SessionLocal()
+        try:
+            db.add(row)
+            db.commit()
+        finally:
+            db.close()
+
+    def _apply(self, jti: Optional[str], user_id: int, not_before: Optional[float], expires: float) -> None:
+        if jti is not None:
+            self._jtis[_jti_hash(jti)] = expires
+        if not_before is not None:
+            current = self._users.get(user_id)
+            if current is None or not_before > current[0]:
+                self._users[user_id] = (not_before, expires)
+        with self._dirty_lock:
+            self._dirty_users.add(user_id)
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # --- sync with other workers ---
+
+    def load(self) -> int:
+        """Pull revocations written since the last sync (all unexpired rows on first call). Blocking."""
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(TokenRevocation)
+                .filter(TokenRevocation.id > self._last_id, TokenRevocation.expires_at > datetime.utcnow())
+                .order_by(TokenRevocation.id)
+                .all()
+            )
+            for row in rows:
+                self._last_id = row.id
+                expires = (row.expires_at - datetime(1970, 1, 1)).total_seconds()
+                self._apply(row.jti, row.user_id, row.not_before, expires)
+            self._syncs += 1
+            if self._syncs % PURGE_EVERY_SYNCS == 0:
+                db.query(TokenRevocation).filter(TokenRevocation.expires_at <= datetime.utcnow()).delete()
+                db.commit()
+            return len(rows)
+        finally:
+            db.close()
+
+    def purge_expired(self, now: Optional[float] = None) -> None:
+        """Drop entries whose tokens would have expired anyway."""
+        now = time.time() if now is None else now
+        # Copies: revocations may be applied concurrently from worker threads
+        for key, exp in list(self._jtis.items()):
+            if exp <= now:
+                self._jtis.pop(key, None)
+        for key, (_, exp) in list(self._users.items()):
+            if exp <= now:
+                self._users.pop(key, None)
+
+    # --- live WebSocket sessions ---
+
+    def track_socket(self, websocket: WebSocket, payload: dict) -> None:
+        user_id = _user_id(payload)
+        if user_id is not None:
+            self._sockets.setdefault(user_id, {})[id(websocket)] = (websocket, payload)
+
+    def untrack_socket(self, websocket: WebSocket, payload: dict) -> None:
+        user_id = _user_id(payload)
+        sockets = self._sockets.get(user_id)
+        if sockets is not None:
+            sockets.pop(id(websocket), None)
+            if not sockets:
+                del self._sockets[user_id]
+
+    async def close_revoked_sockets(self) -> None:
+        """Close live sockets of users touched by new revocations whose token is now revoked."""
+        with self._dirty_lock:
+            dirty, self._dirty_users = self._dirty_users, set()
+        for user_id in dirty:
+            for websocket, payload in list(self._sockets.get(user_id, {}).values()):
+                if not self.is_revoked(payload):
+                    continue
+                logger.info("Closing WS of user_id=%s: token revoked", user_id)
+                self.untrack_socket(websocket, payload)
+                self.sockets_closed += 1
+                try:
+                    await websocket.close(code=REVOKED_CLOSE_CODE)
+                except Exception:
+                    pass  # already closed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.exception("Token revocation sync failed: %s", e)
+            self.purge_expired()
+            await self.close_revoked_sockets()
+
+    async def start(self) -> None:
+        """Load current revocations and start syncing. Call from app startup."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception as e:
+            logger.exception("Token revocation initial load failed: %s", e)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+
+    def stats(self) -> dict:
+        return {
+            "revoked_tokens": len(self._jtis),
+            "revoked_users": len(self._users),
+            "sockets_closed": self.sockets_closed,
+        }
+
+
+_settings = get_settings()
+revocations = RevocationList(
+    sync_interval=_settings.TOKEN_REVOCATION_SYNC_SECONDS,
+    token_ttl=_settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
@@ -1,4 +1,6 @@
 from datetime import timedelta, datetime
+import time
+import uuid
 import bcrypt
 from jose import jwt, JWTError
 from fastapi.security import OAuth2PasswordBearer
@@ -6,6 +8,7 @@ from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
+from app.core.revocation import revocations
 from app.db.database import get_db
 from app.models.user import User
 
@@ -47,16 +50,21 @@ def create_access_token(data: dict) -> str:
     s = get_settings()
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=s.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # jti identifies this token for logout; float iat lets user-wide revocations cut off at sub-second precision
+    to_encode.update({"exp": expire, "iat": time.time(), "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, s.SECRET_KEY, algorithm=s.ALGORITHM)
 
 
 def decode_access_token(token: str):
+    """Return the token payload, or None if it is invalid, expired or revoked."""
     s = get_settings()
     try:
-        return jwt.decode(token, s.SECRET_KEY, algorithms=[s.ALGORITHM])
+        payload = jwt.decode(token, s.SECRET_KEY, algorithms=[s.ALGORITHM])
     except JWTError:
         return None
+    if revocations.is_revoked(payload):
+        return None
+    return payload
 
 
 def get_current_user(
@@ -0,0 +1,121 @@
+"""
+Change counters for conditional GET (ETag / 304 Not Modified) and the hot tail cache.
+
+Every write that changes a listing bumps the counters of the scopes it affects: the conversation
+(unordered user pair), each participant's "all messages" view, and the user directory. Bulk changes
+outside the request path (CLI import, shard rebalance) bump EVERYTHING, which every version includes.
+GET handlers build their ETag from the counter plus the query parameters, so a repeat view whose data
+has not changed is answered with 304 without running the list query or serializing rows.
+
+Counters live in the change_versions table, so all workers agree on them: reading one is a primary-key
+lookup, bumping it an upsert in its own short transaction after the change has been committed.
+"""
+import hashlib
+from typing import Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.change_version import ChangeVersion
+
+# Headers for versioned responses: private (per-user data), always revalidate with If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+DIRECTORY = ("users",)
+# Part of every scope's version: bumped by bulk changes that touch unknown conversations
+EVERYTHING = ("all",)
+
+_UPSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+
+def conversation_key(user_a: int, user_b: int) -> Tuple[str, int, int]:
+    """Scope key of the direct conversation between two users (order-independent)."""
+    return ("conv", min(user_a, user_b), max(user_a, user_b))
+
+
+def inbox_key(user_id: int) -> Tuple[str, int]:
+    """Scope key of all messages a user sent or received."""
+    return ("inbox", user_id)
+
+
+def _scope(key: Hashable) -> str:
+    return ":".join(str(part) for part in key)
+
+
+class ChangeVersions:
+    def _read(self, db: Session, scopes) -> Dict[str, int]:
+        table = ChangeVersion.__table__
+        rows = db.execute(select(table.c.scope, table.c.version).where(table.c.scope.in_(scopes)))
+        return dict(rows.all())
+
+    def get(self, key: Hashable) -> int:
+        """Current version of key (its own counter plus EVERYTHING's). Blocking."""
+        scope = _scope(key)
+        db = SessionLocal()
+        try:
+            counters = self._read(db, [scope, _scope(EVERYTHING)])
+        finally:
+            db.close()
+        return counters.get(scope, 0) + counters.get(_scope(EVERYTHING), 0)
+
+    def bump(self, *keys: Hashable) -> Dict[Hashable, int]:
+        """Increment the counters of keys. Returns each key's new version (as get would). Blocking."""
+        scopes = {_scope(key): key for key in keys}
+        table = ChangeVersion.__table__
+        db = SessionLocal()
+        try:
+            upsert = _UPSERTS.get(db.get_bind().dialect.name)
+            # Sorted, so concurrent bumps lock rows in the same order
+            if upsert is not None:
+                stmt = upsert(table).values([{"scope": scope, "version": 1} for scope in sorted(scopes)])
+                db.execute(stmt.on_conflict_do_update(index_elements=["scope"], set_={"version": table.c.version + 1}))
+            else:
+                for scope in sorted(scopes):
+                    updated = db.execute(
+                        update(table).where(table.c.scope == scope).values(version=table.c.version + 1)
+                    ).rowcount
+                    if not updated:
+                        db.execute(insert(table).values(scope=scope, version=1))
+            counters = self._read(db, list(scopes) + [_scope(EVERYTHING)])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        everything = counters.get(_scope(EVERYTHING), 0)
+        return {
+            key: counters[scope] + (everything if key != EVERYTHING else 0) for scope, key in scopes.items()
+        }
+
+    def bump_message(self, sender_id: int, receiver_id: int) -> int:
+        """New/changed message: bump the conversation and both inboxes. Returns the conversation's new version."""
+        conversation = conversation_key(sender_id, receiver_id)
+        return self.bump(conversation, inbox_key(sender_id), inbox_key(receiver_id))[conversation]
+
+    def etag(self, key: Hashable, version: int, *params) -> str:
+        """Weak ETag for key at version (from get), varied by the request parameters."""
+        raw = f"{key!r}:{version}:{params!r}".encode("utf-8")
+        return f'W/"{hashlib.sha1(raw).hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value matches etag (weak comparison, '*' matches anything)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+versions = ChangeVersions()
@@ -0,0 +1,147 @@
+"""
+Optional zstd compression of message bodies at rest (MESSAGE_COMPRESSION_ENABLED, needs zstandard).
+
+A body of at least MESSAGE_COMPRESSION_MIN_BYTES (UTF-8) is stored as a zstd frame in
+messages.content_compressed with content_codec = "zstd" and content = "". Shorter bodies, bodies that
+do not shrink, and everything written while compression is off stay plain text (content_codec NULL),
+so both kinds of row always coexist and nothing needs a flag day.
+
+Compression happens on write (save_message, import); decompression only where a message is
+serialized for a client (MessageResponse, export, the hot tail cache). A dictionary trained on our
+own messages (python -m app.cli train-compression-dict) helps most for short, similar bodies. Its id
+is recorded in each zstd frame, so rows written with an older dictionary stay readable as long as
+its file is kept in MESSAGE_COMPRESSION_DICT_DIR.
+"""
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_ZSTD = "zstd"
+DICT_SUFFIX = ".zstdict"
+# Keep the plain body unless compression saves at least this fraction
+MIN_SAVING = 0.1
+# zstd needs a reasonable corpus to train a dictionary from
+MIN_DICT_SAMPLES = 100
+
+
+class ContentCodec:
+    def __init__(self, enabled: bool, min_bytes: int, level: int, dict_dir: str, dict_id: int):
+        if enabled and zstandard is None:
+            logger.warning("MESSAGE_COMPRESSION_ENABLED is set but zstandard is not installed; storing plain text")
+            enabled = False
+        self.enabled = enabled
+        self.min_bytes = min_bytes
+        self.level = level
+        self.dict_dir = Path(dict_dir) if dict_dir else None
+        self.dict_id = dict_id
+        self._dicts: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self._dicts_lock = threading.Lock()
+        # zstd (de)compressor objects are not thread-safe: one set per thread
+        self._local = threading.local()
+
+    # --- dictionaries ---
+
+    def _dictionary(self, dict_id: int) -> "zstandard.ZstdCompressionDict":
+        with self._dicts_lock:
+            d = self._dicts.get(dict_id)
+            if d is None:
+                if self.dict_dir is None:
+                    raise ValueError(f"zstd dictionary {dict_id} needed but MESSAGE_COMPRESSION_DICT_DIR is not set")
+                data = (self.dict_dir / f"{dict_id}{DICT_SUFFIX}").read_bytes()
+                d = self._dicts[dict_id] = zstandard.ZstdCompressionDict(data)
+            return d
+
+    def _compressor(self) -> "zstandard.ZstdCompressor":
+        c = getattr(self._local, "compressor", None)
+        if c is None:
+            d = self._dictionary(self.dict_id) if self.dict_id else None
+            c = self._local.compressor = zstandard.ZstdCompressor(level=self.level, dict_data=d)
+        return c
+
+    def _decompressor(self, dict_id: int) -> "zstandard.ZstdDecompressor":
+        by_dict = getattr(self._local, "decompressors", None)
+        if by_dict is None:
+            by_dict = self._local.decompressors = {}
+        dc = by_dict.get(dict_id)
+        if dc is None:
+            d = self._dictionary(dict_id) if dict_id else None
+            dc = by_dict[dict_id] = zstandard.ZstdDecompressor(dict_data=d)
+        return dc
+
+    # --- encode / decode ---
+
+    def encode(self, text: str) -> Tuple[str, Optional[bytes], Optional[str]]:
+        """Storage form of a message body: (content, content_compressed, content_codec)."""
+        if not self.enabled:
+            return text, None, None
+        raw = text.encode("utf-8")
+        if len(raw) < self.min_bytes:
+            return text, None, None
+        blob = self._compressor().compress(raw)
+        if len(blob) > len(raw) * (1 - MIN_SAVING):
+            return text, None, None
+        return "", blob, CODEC_ZSTD
+
+    def decode(self, content: str, blob: Optional[bytes], codec: Optional[str]) -> str:
+        """Message body from its storage form."""
+        if codec is None:
+            return content
+        if codec != CODEC_ZSTD:
+            raise ValueError(f"Unknown message content codec {codec!r}")
+        if zstandard is None:
+            raise RuntimeError("Compressed messages found: install zstandard (pip install zstandard) to read them")
+        blob = bytes(blob)  # memoryview on some drivers
+        dict_id = zstandard.get_frame_parameters(blob).dict_id
+        return self._decompressor(dict_id).decompress(blob).decode("utf-8")
+
+    def text(self, row) -> str:
+        """Body of a Message (or a row with content, content_compressed, content_codec)."""
+        codec = getattr(row, "content_codec", None)
+        if codec is None:
+            return row.content
+        return self.decode(row.content, row.content_compressed, codec)
+
+    # --- dictionary training ---
+
+    def train_dictionary(self, samples: Iterable[str], size: int) -> Tuple[int, Path]:
+        """Train a dictionary on message bodies and save it to MESSAGE_COMPRESSION_DICT_DIR. Returns (id, path)."""
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed (pip install zstandard)")
+        if self.dict_dir is None:
+            raise ValueError("Set MESSAGE_COMPRESSION_DICT_DIR to where dictionaries are kept")
+        data: List[bytes] = [s.encode("utf-8") for s in samples if s]
+        if len(data) < MIN_DICT_SAMPLES:
+            raise ValueError(f"Need at least {MIN_DICT_SAMPLES} non-empty messages to train a dictionary, got {len(data)}")
+        try:
+            d = zstandard.train_dictionary(size, data, level=self.level)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Dictionary training failed ({e}); try more samples or a smaller --size") from e
+        os.makedirs(self.dict_dir, exist_ok=True)
+        path = self.dict_dir / f"{d.dict_id()}{DICT_SUFFIX}"
+        path.write_bytes(d.as_bytes())
+        return d.dict_id(), path
+
+
+def create_codec() -> ContentCodec:
+    s = get_settings()
+    return ContentCodec(
+        enabled=s.MESSAGE_COMPRESSION_ENABLED,
+        min_bytes=s.MESSAGE_COMPRESSION_MIN_BYTES,
+        level=s.MESSAGE_COMPRESSION_LEVEL,
+        dict_dir=s.MESSAGE_COMPRESSION_DICT_DIR,
+        dict_id=s.MESSAGE_COMPRESSION_DICT_ID,
+    )
+
+
+message_codec = create_codec()
@@ -0,0 +1,210 @@
+"""
+In-memory hot tail of recent messages per conversation.
+
+Each conversation (unordered user pair) keeps a ring buffer of its newest MESSAGE_CACHE_SIZE messages,
+filled from the DB on the first GET /messages/?with_user_id=... and extended by every message saved
+through /ws/chat afterwards. Opening a conversation again is then served from memory; older pages
+(before_id) and the all-messages view still query the DB.
+
+Conversations are evicted least recently used first once the estimated size of all buffers exceeds
+MESSAGE_CACHE_MAX_BYTES. The buffers are per process, but each one records the conversation's shared
+version (app.core.versions) it reflects and is only served while that is still the current version,
+which GET /messages/ reads for its ETag anyway. A message saved on another worker, an import, a
+rebalance or a deleted peer moves the version on, and the next read refills from the DB. A local save
+extends the buffer only if it moves the version by exactly one step, i.e. nothing else happened since.
+"""
+import sys
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Hashable, Iterable, List, Optional
+
+from app.core.config import get_settings
+from app.core.versions import conversation_key
+from app.db.compression import message_codec
+
+# Rough per-record cost besides the strings: object with slots, datetime, ints, deque slot
+RECORD_OVERHEAD = 200
+
+
+class CachedMessage:
+    """Compact copy of a Message row (same attributes, so MessageResponse validates it directly)."""
+
+    __slots__ = ("id", "sender_id", "receiver_id", "content", "media_url", "created_at", "client_msg_id")
+
+    def __init__(self, id: int, sender_id: int, receiver_id: int, content: str, media_url: Optional[str],
+                 created_at: Optional[datetime], client_msg_id: Optional[str]):
+        self.id = id
+        self.sender_id = sender_id
+        self.receiver_id = receiver_id
+        self.content = content
+        self.media_url = media_url
+        self.created_at = created_at
+        self.client_msg_id = client_msg_id
+
+    @classmethod
+    def from_row(cls, row, content: Optional[str] = None) -> "CachedMessage":
+        """Copy of a row with its body decompressed (unless the plain content is passed in)."""
+        if content is None:
+            content = message_codec.text(row)
+        return cls(row.id, row.sender_id, row.receiver_id, content, row.media_url, row.created_at,
+                   row.client_msg_id)
+
+    def size(self) -> int:
+        size = RECORD_OVERHEAD + sys.getsizeof(self.content)
+        if self.media_url is not None:
+            size += sys.getsizeof(self.media_url)
+        if self.client_msg_id is not None:
+            size += sys.getsizeof(self.client_msg_id)
+        return size
+
+
+class _Tail:
+    """Newest messages of one conversation, oldest first, as of version. complete: no older messages exist."""
+
+    __slots__ = ("messages", "complete", "nbytes", "version")
+
+    def __init__(self, capacity: int, version: int):
+        self.messages: Deque[CachedMessage] = deque(maxlen=capacity)
+        self.complete = False
+        self.nbytes = 0
+        self.version = version
+
+
+class MessageCache:
+    def __init__(self, per_conversation: int, max_bytes: int):
+        self.per_conversation = per_conversation
+        self.max_bytes = max_bytes
+        self.enabled = per_conversation > 0 and max_bytes > 0
+        self._tails: "OrderedDict[Hashable, _Tail]" = OrderedDict()
+        self._nbytes = 0
+        # Reads run in the threadpool (sync routes), writes on the event loop
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_a: int, user_b: int, limit: int, version: int) -> Optional[List[CachedMessage]]:
+        """
+        Newest `limit` messages of the conversation (newest first), or None if not fully cached at
+        `version` (the conversation's current version, from versions.get).
+        """
+        if not self.enabled:
+            return None
+        key = conversation_key(user_a, user_b)
+        with self._lock:
+            tail = self._tails.get(key)
+            if tail is not None and tail.version != version:
+                self._drop(key)  # changed elsewhere since it was cached
+                tail = None
+            if tail is None or (limit > len(tail.messages) and not tail.complete):
+                self.misses += 1
+                return None
+            self._tails.move_to_end(key)
+            self.hits += 1
+            messages = list(tail.messages)
+        messages.reverse()
+        return messages[:limit]
+
+    def fill_limit(self, limit: int) -> int:
+        """Rows to read on a miss so the result can also fill the buffer."""
+        return max(limit, self.per_conversation) if self.enabled else limit
+
+    def fill(self, user_a: int, user_b: int, rows: Iterable, fetched_limit: int, version: int) -> None:
+        """
+        Install the conversation's newest rows (newest first, as queried with fetched_limit), read after
+        the conversation was at `version`. If it changed meanwhile, the rows may include newer messages
+        than `version` says, never fewer: the next get or append notices and refills or extends.
+        """
+        if not self.enabled:
+            return
+        key = conversation_key(user_a, user_b)
+        rows = list(rows)
+        tail = _Tail(self.per_conversation, version)
+        for row in reversed(rows[:self.per_conversation]):
+            record = CachedMessage.from_row(row)
+            tail.messages.append(record)
+            tail.nbytes += record.size()
+        tail.complete = len(rows) < fetched_limit and len(rows) <= self.per_conversation
+        with self._lock:
+            old = self._tails.get(key)
+            if old is not None:
+                if old.version > version:
+                    return  # already extended past what this read saw
+                self._drop(key)
+            self._tails[key] = tail
+            self._nbytes += tail.nbytes
+            self._evict()
+
+    def append(self, message, version: int, content: Optional[str] = None) -> None:
+        """
+        Add a newly saved message to its conversation's buffer, if that conversation is cached.
+        version: the conversation's version after saving it (from versions.bump_message).
+        """
+        if not self.enabled:
+            return
+        key = conversation_key(message.sender_id, message.receiver_id)
+        record = CachedMessage.from_row(message, content)
+        with self._lock:
+            tail = self._tails.get(key)
+            if tail is None or tail.version >= version:
+                return  # filled from the DB on first read / the fill already saw it
+            if tail.version != version - 1:
+                self._drop(key)  # something else changed in between
+                return
+            tail.version = version
+            if tail.messages and tail.messages[-1].id >= record.id:
+                return  # committed before the fill's query ran, so already in the buffer
+            size = record.size()
+            if len(tail.messages) == tail.messages.maxlen:
+                size -= tail.messages[0].size()  # oldest falls out of the ring
+                tail.complete = False
+            tail.messages.append(record)
+            tail.nbytes += size
+            self._nbytes += size
+            self._tails.move_to_end(key)
+            self._evict()
+
+    def discard(self, user_a: int, user_b: int) -> None:
+        """Drop one conversation's buffer (e.g. its version could not be bumped after a save)."""
+        with self._lock:
+            if conversation_key(user_a, user_b) in self._tails:
+                self._drop(conversation_key(user_a, user_b))
+
+    def forget_user(self, user_id: int) -> None:
+        """Drop every conversation of a user (e.g. account deleted, messages cascaded)."""
+        with self._lock:
+            for key in [k for k in self._tails if user_id in k[1:]]:
+                self._drop(key)
+
+    def _drop(self, key: Hashable) -> None:
+        self._nbytes -= self._tails.pop(key).nbytes
+
+    def _evict(self) -> None:
+        while self._nbytes > self.max_bytes and self._tails:
+            _, tail = self._tails.popitem(last=False)
+            self._nbytes -= tail.nbytes
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            messages = sum(len(t.messages) for t in self._tails.values())
+        return {
+            "enabled": self.enabled,
+            "conversations": len(self._tails),
+            "messages": messages,
+            "bytes": self._nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+_settings = get_settings()
+message_cache = MessageCache(
+    per_conversation=_settings.MESSAGE_CACHE_SIZE,
+    max_bytes=_settings.MESSAGE_CACHE_MAX_BYTES,
+)
@@ -0,0 +1,375 @@
+"""
+Bulk export/import of messages with flat memory use.
+
+Export streams rows through a server-side cursor (yield_per => stream_results on PostgreSQL) and
+serializes them one at a time as NDJSON or CSV, so memory does not grow with history size.
+Import reads NDJSON/CSV in batches and writes each batch with COPY on PostgreSQL, or a multi-row
+INSERT elsewhere. Both follow the shard layout of app.db.shards.
+Used by GET /messages/export and the app.cli commands.
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import bindparam, create_engine, delete, func, insert, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+
+from sqlalchemy.orm import Session
+
+from app.core.versions import EVERYTHING, versions
+from app.db.compression import message_codec
+from app.db.shards import shards
+from app.models.message import Message
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+FORMATS = (FORMAT_NDJSON, FORMAT_CSV)
+MEDIA_TYPES = {FORMAT_NDJSON: "application/x-ndjson", FORMAT_CSV: "text/csv"}
+
+# Columns in export order. id is exported for reference but not imported (target assigns new ids).
+EXPORT_COLUMNS = ["id", "sender_id", "receiver_id", "content", "media_url", "created_at", "client_msg_id"]
+IMPORT_COLUMNS = ["sender_id", "receiver_id", "content", "media_url", "created_at", "client_msg_id"]
+# Columns as stored: bodies may be compressed (app.db.compression)
+STORED_COLUMNS = IMPORT_COLUMNS + ["content_compressed", "content_codec"]
+# uq_messages_sender_client_msg_id: a row already present under these is skipped on import, so a
+# re-run or resumed import does not fail. Rows without client_msg_id (legacy) never conflict.
+CONFLICT_COLUMNS = ["sender_id", "client_msg_id"]
+
+DEFAULT_BATCH_SIZE = 1000
+# Serialized rows are buffered into chunks of about this many characters per write
+CHUNK_SIZE = 64 * 1024
+
+
+def _row_dict(msg) -> dict:
+    return {
+        "id": msg.id,
+        "sender_id": msg.sender_id,
+        "receiver_id": msg.receiver_id,
+        "content": message_codec.text(msg),
+        "media_url": msg.media_url,
+        "created_at": msg.created_at.isoformat() if msg.created_at else None,
+        "client_msg_id": msg.client_msg_id,
+    }
+
+
+def iter_messages(
+    user_id: Optional[int] = None,
+    with_user_id: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[dict]:
+    """
+    Yield messages (oldest first) as dicts, fetched batch_size rows at a time from a server-side
+    cursor. user_id=None exports every message. Opens and closes its own session, so it can outlive
+    the request dependency (e.g. inside a StreamingResponse).
+    """
+    # Plain column rows, not ORM objects: nothing accumulates in the session's identity map
+    stmt = select(
+        *(getattr(Message, c) for c in EXPORT_COLUMNS), Message.content_compressed, Message.content_codec
+    ).order_by(Message.id)
+    if user_id is not None:
+        stmt = stmt.where(or_(Message.sender_id == user_id, Message.receiver_id == user_id))
+        if with_user_id is not None:
+            stmt = stmt.where(or_(
+                (Message.sender_id == user_id) & (Message.receiver_id == with_user_id),
+                (Message.receiver_id == user_id) & (Message.sender_id == with_user_id),
+            ))
+    if user_id is not None and with_user_id is not None:
+        engines = [shards.engine_for(user_id, with_user_id)]
+    else:
+        engines = shards.engines  # one shard after another; ids are ordered within each shard
+    for shard_engine in engines:
+        db = Session(bind=shard_engine)
+        try:
+            result = db.execute(stmt.execution_options(yield_per=batch_size))
+            for partition in result.partitions():
+                for row in partition:
+                    yield _row_dict(row)
+        finally:
+            db.close()
+
+
+def sample_contents(limit: int) -> List[str]:
+    """Up to limit message bodies (newest first, spread over all shards), decompressed."""
+    per_shard = max(1, limit // len(shards))
+    stmt = (
+        select(Message.content, Message.content_compressed, Message.content_codec)
+        .where(or_(Message.content != "", Message.content_codec.isnot(None)))  # skip image-only messages
+        .order_by(Message.id.desc())
+        .limit(per_shard)
+    )
+    samples: List[str] = []
+    for shard_engine in shards.engines:
+        with shard_engine.connect() as conn:
+            samples.extend(message_codec.text(row) for row in conn.execute(stmt))
+    return samples
+
+
+def to_ndjson(rows: Iterable[dict]) -> Iterator[str]:
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(json.dumps(row, ensure_ascii=False))
+        buf.write("\n")
+        if buf.tell() >= CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def to_csv(rows: Iterable[dict]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def export_stream(fmt: str, rows: Iterable[dict]) -> Iterator[str]:
+    if fmt == FORMAT_CSV:
+        return to_csv(rows)
+    return to_ndjson(rows)
+
+
+def _parse_row(raw: dict) -> dict:
+    """Normalize an imported NDJSON object / CSV record to Message column values."""
+    def opt(value):
+        return None if value in (None, "") else value
+
+    created_at = opt(raw.get("created_at"))
+    return {
+        "sender_id": int(raw["sender_id"]),
+        "receiver_id": int(raw["receiver_id"]),
+        "content": raw.get("content") or "",
+        "media_url": opt(raw.get("media_url")),
+        "created_at": datetime.fromisoformat(created_at) if created_at else datetime.utcnow(),
+        "client_msg_id": opt(raw.get("client_msg_id")),
+    }
+
+
+def read_rows(fmt: str, stream: Iterable[str]) -> Iterator[dict]:
+    """Parse an NDJSON or CSV export (as produced above) lazily into Message column values."""
+    if fmt == FORMAT_CSV:
+        for record in csv.DictReader(stream):
+            yield _parse_row(record)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield _parse_row(json.loads(line))
+
+
+def _batches(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    batch: List[dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return "\\x" + bytes(value).hex()  # bytea hex input format
+    return value
+
+
+def _copy_batch(engine: Engine, batch: List[dict]) -> int:
+    """
+    PostgreSQL: COPY one batch (CSV) into a temporary staging table, then INSERT ... SELECT it into
+    messages with ON CONFLICT DO NOTHING. Returns rows inserted. None is written as an unquoted empty
+    field (= NULL); an empty content is that too, so FORCE_NOT_NULL turns it back into ''.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in batch:
+        writer.writerow([_copy_value(row[c]) for c in STORED_COLUMNS])
+    buf.seek(0)
+    raw = engine.raw_connection()
+    try:
+        columns = ", ".join(STORED_COLUMNS)
+        cur = raw.cursor()
+        cur.execute(
+            f"CREATE TEMP TABLE import_staging ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {Message.__tablename__} WITH NO DATA"
+        )
+        cur.copy_expert(
+            f"COPY import_staging ({columns}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (content))", buf
+        )
+        cur.execute(
+            f"INSERT INTO {Message.__tablename__} ({columns}) SELECT {columns} FROM import_staging "
+            f"ON CONFLICT ({', '.join(CONFLICT_COLUMNS)}) DO NOTHING"
+        )
+        inserted = cur.rowcount
+        raw.commit()
+        return inserted
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def _insert_batch(engine: Engine, batch: List[dict]) -> int:
+    """Other databases: one multi-row INSERT per batch (ON CONFLICT DO NOTHING on SQLite). Returns rows inserted."""
+    if engine.dialect.name == "sqlite":
+        stmt = sqlite_insert(Message.__table__).values(batch).on_conflict_do_nothing(index_elements=CONFLICT_COLUMNS)
+    else:
+        stmt = insert(Message.__table__).values(batch)
+    with engine.begin() as conn:
+        return conn.execute(stmt).rowcount
+
+
+def write_batch(engine: Engine, batch: List[dict]) -> int:
+    """Bulk-insert one batch, skipping rows already present: COPY on PostgreSQL, multi-row INSERT elsewhere."""
+    if engine.dialect.name == "postgresql":
+        return _copy_batch(engine, batch)
+    return _insert_batch(engine, batch)
+
+
+def _stored_row(row: dict) -> dict:
+    """Imported row in storage form (body compressed if enabled and large enough)."""
+    content, compressed, codec = message_codec.encode(row["content"])
+    return {**row, "content": content, "content_compressed": compressed, "content_codec": codec}
+
+
+def import_rows(rows: Iterable[dict], batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Bulk-load rows (from read_rows) into messages, each on its conversation's shard.
+    Each batch commits on its own; rows already present (same sender_id and client_msg_id) are
+    skipped, so an interrupted import can simply be run again. Returns {"imported": n, "skipped": n}.
+    """
+    counts = {"imported": 0, "skipped": 0}
+    for batch in _batches(map(_stored_row, rows), batch_size):
+        by_shard: dict = {}
+        for row in batch:
+            by_shard.setdefault(shards.shard_index(row["sender_id"], row["receiver_id"]), []).append(row)
+        inserted = sum(write_batch(shards.engines[index], shard_rows) for index, shard_rows in by_shard.items())
+        if inserted:
+            versions.bump(EVERYTHING)  # conversations changed: invalidate ETags and cached tails everywhere
+        counts["imported"] += inserted
+        counts["skipped"] += len(batch) - inserted
+    return counts
+
+
+def rebalance(source_urls: List[str], batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Move messages from an old shard layout (source_urls, in their old order) to the current one
+    (MESSAGE_SHARD_URLS). Each source is walked by id, batch_size rows at a time in short transactions:
+    the page's rows whose conversation now maps to a different database are copied there, then deleted
+    from the source. An interrupted run therefore never loses messages and leaves at most one page
+    copied but not deleted; running it again skips those rows by client_msg_id (legacy rows without
+    one can end up duplicated). Moved rows get new ids on their target shard. Each page's writes and
+    delete bump EVERYTHING (ids change, so cached tails and ETags are stale).
+    Returns moved-row counts per source URL.
+    """
+    current = {url: shards.engines[i] for i, url in enumerate(shards.urls)}
+    # Bodies are copied in their stored form, compressed or not
+    stmt = select(Message.id, *(getattr(Message, c) for c in STORED_COLUMNS)).order_by(Message.id).limit(batch_size)
+    moved: Dict[str, int] = {}
+    for url in source_urls:
+        source = current.get(url)
+        temporary = source is None
+        if temporary:
+            source = create_engine(url)
+        try:
+            count = 0
+            last_id = 0
+            while True:
+                with source.connect() as conn:
+                    page = conn.execute(stmt.where(Message.id > last_id)).all()
+                if not page:
+                    break
+                last_id = page[-1].id
+                by_target: Dict[int, List] = {}
+                for row in page:
+                    target = shards.shard_index(row.sender_id, row.receiver_id)
+                    if shards.urls[target] != url:
+                        by_target.setdefault(target, []).append(row)
+                moving = [row.id for rows in by_target.values() for row in rows]
+                count += len(moving)
+                if dry_run or not moving:
+                    continue
+                for target, rows in by_target.items():
+                    write_batch(shards.engines[target], [{c: getattr(row, c) for c in STORED_COLUMNS} for row in rows])
+                versions.bump(EVERYTHING)
+                with source.begin() as conn:
+                    conn.execute(delete(Message.__table__).where(Message.id.in_(moving)))
+                versions.bump(EVERYTHING)
+            moved[url] = count
+        finally:
+            if temporary:
+                source.dispose()
+    return moved
+
+
+def recompress(
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    decompress: bool = False,
+    all_rows: bool = False,
+    pause: float = 0.0,
+) -> Dict[str, int]:
+    """
+    Bring stored bodies in line with the current compression settings, shard by shard, one short
+    transaction per batch (walks ids upwards, so it can run next to live traffic and be restarted).
+      - default: compress plain bodies of at least MESSAGE_COMPRESSION_MIN_BYTES
+      - all_rows: also re-encode compressed bodies (e.g. with a new dictionary)
+      - decompress: store every compressed body as plain text again (before turning compression off)
+    pause sleeps between batches to limit load. Returns {"scanned": n, "changed": n}.
+    """
+    if not decompress and not message_codec.enabled:
+        raise RuntimeError("Compression is off: set MESSAGE_COMPRESSION_ENABLED=true (and install zstandard)")
+    columns = (Message.id, Message.content, Message.content_compressed, Message.content_codec)
+    if decompress:
+        candidates = Message.content_codec.isnot(None)
+    elif all_rows:
+        candidates = or_(Message.content_codec.isnot(None), func.length(Message.content) >= message_codec.min_bytes)
+    else:
+        # Character length is a lower bound of the UTF-8 size: a cheap pre-filter, encode() decides
+        candidates = Message.content_codec.is_(None) & (func.length(Message.content) >= message_codec.min_bytes)
+    stmt = update(Message.__table__).where(Message.__table__.c.id == bindparam("row_id")).values(
+        content=bindparam("new_content"),
+        content_compressed=bindparam("new_compressed"),
+        content_codec=bindparam("new_codec"),
+    )
+    counts = {"scanned": 0, "changed": 0}
+    for shard_engine in shards.engines:
+        last_id = 0
+        while True:
+            with shard_engine.begin() as conn:
+                rows = conn.execute(
+                    select(*columns).where(candidates, Message.id > last_id).order_by(Message.id).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                changes = []
+                for row in rows:
+                    text = message_codec.text(row)
+                    content, compressed, codec = (text, None, None) if decompress else message_codec.encode(text)
+                    if codec is None and row.content_codec is None:
+                        continue  # plain before and after
+                    changes.append({
+                        "row_id": row.id, "new_content": content, "new_compressed": compressed, "new_codec": codec,
+                    })
+                if changes:
+                    conn.execute(stmt, changes)
+            counts["scanned"] += len(rows)
+            counts["changed"] += len(changes)
+            if pause:
+                time.sleep(pause)
+    return counts
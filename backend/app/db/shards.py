@@ -0,0 +1,138 @@
+"""
+Optional hash sharding of the messages table across several databases.
+
+With MESSAGE_SHARD_URLS unset, every message lives in the primary DATABASE_URL (one shard). With a
+comma-separated list of URLs, each direct conversation (the unordered sender/receiver pair) is routed
+to one of them by jump consistent hash, so a conversation's history is always shard-local and adding
+a shard moves only ~1/N of the conversations (see `python -m app.cli rebalance-messages`).
+
+Users, media and all other tables stay on the primary database. Shard databases hold only a messages
+table, without foreign keys to users (which live elsewhere). Message ids are per shard: unique within
+a conversation, not globally.
+"""
+import hashlib
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from sqlalchemy import Column, MetaData, Table, UniqueConstraint, create_engine, delete, inspect, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import get_settings
+from app.db.database import DATABASE_URL, SessionLocal, engine
+from app.models.message import Message
+
+
+def jump_hash(key: int, num_buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): bucket in [0, num_buckets) for a 64-bit key."""
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def conversation_hash(user_a: int, user_b: int) -> int:
+    """Stable 64-bit hash of the unordered user pair (same in every process, unlike hash())."""
+    raw = f"{min(user_a, user_b)}:{max(user_a, user_b)}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big")
+
+
+def parse_shard_urls(value: str) -> List[str]:
+    return [u.strip() for u in (value or "").split(",") if u.strip()]
+
+
+def shard_messages_table(metadata: MetaData) -> Table:
+    """Copy of the messages table for shard databases: same columns, indexes and unique constraints, no FKs."""
+    source = Message.__table__
+    columns = [
+        Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable, index=c.index)
+        for c in source.columns
+    ]
+    uniques = [
+        UniqueConstraint(*(c.name for c in uc.columns), name=uc.name)
+        for uc in source.constraints
+        if isinstance(uc, UniqueConstraint)
+    ]
+    return Table(source.name, metadata, *columns, *uniques)
+
+
+class ShardRouter:
+    def __init__(self, urls: List[str]):
+        self.urls = urls or [DATABASE_URL]
+        self.enabled = bool(urls)
+        self.engines: List[Engine] = [
+            engine if url == DATABASE_URL else create_engine(url, pool_pre_ping=True) for url in self.urls
+        ]
+        self._sessionmakers = [
+            SessionLocal if e is engine else sessionmaker(autocommit=False, autoflush=False, bind=e)
+            for e in self.engines
+        ]
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_index(self, user_a: int, user_b: int) -> int:
+        return jump_hash(conversation_hash(user_a, user_b), len(self.engines))
+
+    def engine_for(self, user_a: int, user_b: int) -> Engine:
+        return self.engines[self.shard_index(user_a, user_b)]
+
+    def session_for(self, user_a: int, user_b: int) -> Session:
+        """New session on the shard holding the conversation between user_a and user_b. Caller closes it."""
+        return self._sessionmakers[self.shard_index(user_a, user_b)]()
+
+    @contextmanager
+    def sessions(self, db: Session, user_id: int, with_user_id: Optional[int] = None) -> Iterator[List[Session]]:
+        """
+        Sessions to query a user's messages: the conversation's shard if with_user_id is given, otherwise
+        every shard. Without sharding this is just [db] (the request session), so nothing extra is opened.
+        """
+        if not self.enabled:
+            yield [db]
+            return
+        if with_user_id is not None:
+            opened = [self.session_for(user_id, with_user_id)]
+        else:
+            opened = [make() for make in self._sessionmakers]
+        try:
+            yield opened
+        finally:
+            for session in opened:
+                session.close()
+
+    def delete_user_messages(self, user_id: int) -> int:
+        """
+        Delete every message a user sent or received, on every shard. Shard tables have no foreign keys,
+        so deleting the user on the primary does not cascade there. Returns rows deleted.
+        """
+        table = Message.__table__
+        stmt = delete(table).where(or_(table.c.sender_id == user_id, table.c.receiver_id == user_id))
+        deleted = 0
+        for e in self.engines:
+            with e.begin() as conn:
+                deleted += conn.execute(stmt).rowcount
+        return deleted
+
+    def create_tables(self) -> None:
+        """
+        Create the messages table on shard databases that are not the primary, and add columns added
+        to Message since (Alembic migrates only the primary; new message columns must be nullable).
+        """
+        metadata = MetaData()
+        table = shard_messages_table(metadata)
+        for e in self.engines:
+            if e is engine:
+                continue
+            metadata.create_all(bind=e, tables=[table])
+            existing = {c["name"] for c in inspect(e).get_columns(table.name)}
+            with e.begin() as conn:
+                for column in table.columns:
+                    if column.name not in existing:
+                        conn.execute(text(
+                            f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=e.dialect)}"
+                        ))
+
+
+shards = ShardRouter(parse_shard_urls(get_settings().MESSAGE_SHARD_URLS))
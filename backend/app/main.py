@@ -1,11 +1,13 @@
 import sys
-from pathlib import Path
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.core.config import get_settings
+from app.core.loop_monitor import LoopMonitorMiddleware, loop_monitor
+from app.core.revocation import revocations
 
 # WebSocket support: uvicorn must run with the same Python that has 'websockets' installed
 try:
@@ -14,18 +16,51 @@ except ImportError:
     print("ERROR: WebSocket support requires 'websockets'. Run: pip install websockets", file=sys.stderr)
     print("Or: pip install 'uvicorn[standard]'", file=sys.stderr)
 from app.db.database import Base, engine
+from app.db.message_cache import message_cache
+from app.db.shards import shards
 from app.routes import user as user_routes
 from app.routes import messages as messages_routes
 from app.routes import media as media_routes
+from app.routes import presence as presence_routes
 from app.websocket import chat as ws_chat
+from app.websocket.ephemeral import read_receipts
+from app.websocket.heartbeat import heartbeat
+from app.websocket.manager import manager
+from app.websocket.presence import presence
 from app.models.message import Message  # noqa: F401 - register for create_all
+from app.models.read_receipt import ReadReceipt  # noqa: F401 - register for create_all
+from app.models.media import MediaObject  # noqa: F401 - register for create_all
+from app.models.token_revocation import TokenRevocation  # noqa: F401 - register for create_all
+from app.models.presence import UserPresence  # noqa: F401 - register for create_all
+from app.models.change_version import ChangeVersion  # noqa: F401 - register for create_all
+from app.storage.factory import get_uploads_dir
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background tasks (revocation sync, read receipt flusher, WS heartbeat, presence, loop monitor); stop them on shutdown."""
+    if loop_monitor is not None:
+        loop_monitor.start()
+    await revocations.start()
+    read_receipts.start(settings.READ_RECEIPT_FLUSH_SECONDS)
+    heartbeat.start()
+    presence.start(manager.send_personal_message)
+    yield
+    await presence.stop()
+    await heartbeat.stop()
+    await revocations.stop()
+    await read_receipts.stop()
+    if loop_monitor is not None:
+        await loop_monitor.stop()
+
+
 app = FastAPI(
     title="Chat Application API",
     description="Backend API for the chat application",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 cors_origins_list = settings.get_cors_origins_list()
@@ -39,19 +74,22 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+if loop_monitor is not None and loop_monitor.debug:
+    # Outermost, so stalls are attributed to the request/WebSocket task that was running
+    app.add_middleware(LoopMonitorMiddleware)
 
 app.include_router(user_routes.router, prefix="/api/v1")
 app.include_router(messages_routes.router, prefix="/api/v1")
 app.include_router(media_routes.router, prefix="/api/v1")
+app.include_router(presence_routes.router, prefix="/api/v1")
 # WebSocket chat endpoint at /ws/chat (no /api/v1 prefix)
 app.include_router(ws_chat.router)
 
-# Serve uploaded images at /uploads (for chat media)
-uploads_dir = Path(__file__).resolve().parents[1] / "uploads"
-uploads_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
+# Serve uploaded images at /uploads (for chat media on the local storage backend)
+app.mount("/uploads", StaticFiles(directory=str(get_uploads_dir())), name="uploads")
 
 Base.metadata.create_all(bind=engine)
+shards.create_tables()
 @app.get("/")
 def root():
     return {"message": "working", "docs": "/docs"}
@@ -65,7 +103,7 @@ def health():
 
 @app.get("/health/ready")
 def health_ready():
-    """Readiness: checks DB connectivity. Use for k8s readinessProbe."""
+    """Readiness: checks DB connectivity. Use for k8s readinessProbe. Includes event-loop stall stats when enabled."""
     from sqlalchemy import text
     try:
         from app.db.database import engine
@@ -73,8 +111,26 @@ def health_ready():
             conn.execute(text("SELECT 1"))
     except Exception as e:
         from fastapi.responses import JSONResponse
-        return JSONResponse(
-            status_code=503,
-            content={"status": "unhealthy", "detail": "database unavailable", "error": str(e)},
-        )
-    return {"status": "ok"}
\ No newline at end of file
+        content = {"status": "unhealthy", "detail": "database unavailable", "error": str(e)}
+        if loop_monitor is not None:
+            content["event_loop"] = loop_monitor.stats()
+        return JSONResponse(status_code=503, content=content)
+    if loop_monitor is not None:
+        return {"status": "ok", "event_loop": loop_monitor.stats()}
+    return {"status": "ok"}
+
+
+@app.get("/health/ws")
+def health_ws():
+    """WebSocket connection counts, heartbeat counters (pings sent, idle connections reaped) and presence."""
+    return {
+        "active_connections": len(manager.active_connections),
+        **heartbeat.stats(),
+        "presence": presence.stats(),
+    }
+
+
+@app.get("/health/cache")
+def health_cache():
+    """Hot tail message cache: hit rate, cached conversations/messages and estimated memory use."""
+    return message_cache.stats()
@@ -0,0 +1,16 @@
+"""
+Change counters behind ETags and the message cache (app.core.versions), shared by all workers.
+One row per scope (conversation, inbox, user directory, everything); version only goes up.
+"""
+from sqlalchemy import BigInteger, Column, String
+
+from app.db.database import Base
+
+
+class ChangeVersion(Base):
+    """Table for storing the change counter of each listing scope."""
+
+    __tablename__ = "change_versions"
+
+    scope = Column(String(64), primary_key=True)  # e.g. "conv:1:2", "inbox:1", "users", "all"
+    version = Column(BigInteger, nullable=False, default=0)
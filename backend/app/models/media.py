@@ -0,0 +1,37 @@
+"""
+Uploaded media objects. A row is created when a client asks for an upload URL (pending) and marked
+ready once the completion callback has validated the stored object. Only ready objects may be used
+as Message.media_url.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, Integer, ForeignKey, String, DateTime
+
+from app.db.database import Base
+
+
+class MediaObject(Base):
+    """Table for storing metadata of media uploaded to the storage backend."""
+
+    __tablename__ = "media_objects"
+
+    STATUS_PENDING = 0
+    STATUS_READY = 1
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(128), unique=True, nullable=False, index=True)  # object key in storage, e.g. <uuid>.jpg
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    content_type = Column(String(64), nullable=False)
+    size = Column(Integer, nullable=True)  # set when validated
+    status = Column(Integer, nullable=False, default=STATUS_PENDING)  # 0=pending, 1=ready
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+def key_from_media_url(media_url: str) -> Optional[str]:
+    """
+    Object key referenced by a media_url (/uploads/<key> or /api/v1/media/files/<key>): its last
+    segment. Check media_url == get_storage().public_path(key) before trusting it.
+    """
+    key = media_url.rstrip("/").rsplit("/", 1)[-1]
+    return key or None
@@ -3,7 +3,7 @@ Individual/direct message model. Stores each message with sender, receiver, and
 """
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, ForeignKey, String, Text, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, String, Text, DateTime, LargeBinary, UniqueConstraint
 
 from app.db.database import Base
 
@@ -12,6 +12,7 @@ class Message(Base):
     """Table for storing individual (direct) messages between users."""
 
     __tablename__ = "messages"
+    __table_args__ = (UniqueConstraint("sender_id", "client_msg_id", name="uq_messages_sender_client_msg_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     sender_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -19,3 +20,7 @@ class Message(Base):
     content = Column(Text, nullable=False)  # text caption; empty string for image-only
     media_url = Column(String(512), nullable=True, index=False)  # relative path e.g. /uploads/xxx.jpg
     created_at = Column(DateTime, default=datetime.utcnow)
+    client_msg_id = Column(String(64), nullable=True)  # sender-chosen id for idempotent retries; NULL for legacy
+    # Compressed at rest (app.db.compression): codec "zstd" => body is in content_compressed, content is ""
+    content_compressed = Column(LargeBinary, nullable=True)
+    content_codec = Column(String(16), nullable=True)  # NULL = content is plain text
@@ -0,0 +1,20 @@
+"""
+Online users per worker. Each worker keeps one row per user with a live /ws/chat socket on it and
+refreshes seen_at for all of its rows periodically; rows of a worker that stopped refreshing (crash)
+are ignored after PRESENCE_TTL_SECONDS and purged. A user is online if any fresh row exists.
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime
+
+from app.db.database import Base
+
+
+class UserPresence(Base):
+    """Table for storing which worker holds a live WebSocket of which user."""
+
+    __tablename__ = "user_presence"
+
+    worker_id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, primary_key=True, index=True)  # no FK: rows are transient
+    seen_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,22 @@
+"""
+Read state per conversation. One row per (reader, peer): the highest message id the reader has seen
+from that peer. Written in batches by the ephemeral event flusher, never on the WebSocket hot path.
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint
+
+from app.db.database import Base
+
+
+class ReadReceipt(Base):
+    """Table for storing the last read message id of each direct conversation."""
+
+    __tablename__ = "read_receipts"
+    __table_args__ = (UniqueConstraint("user_id", "peer_id", name="uq_read_receipts_user_peer"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    peer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    last_read_message_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
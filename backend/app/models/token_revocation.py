@@ -0,0 +1,23 @@
+"""
+Revoked access tokens. A row either revokes one token (jti) or every token of a user issued before
+not_before (password change, deactivation). Rows are kept until expires_at, after which the tokens
+they cover have expired anyway. Workers mirror this table into an in-memory denylist.
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Float, DateTime
+
+from app.db.database import Base
+
+
+class TokenRevocation(Base):
+    """Table for storing token revocations (logout, password change, deactivation)."""
+
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String(64), nullable=True)  # set for single-token revocations
+    user_id = Column(Integer, nullable=False, index=True)  # no FK: must outlive deleted users
+    not_before = Column(Float, nullable=True)  # set for user-wide revocations: tokens with iat < this
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,15 +1,30 @@
 """
-Upload and serve media (images) for chat. Uploaded files are stored under backend/uploads/.
+Upload and serve media (images) for chat through the configured storage backend (app.storage).
+
+Direct-to-storage flow (preferred):
+  1. POST /media/uploads           -> presigned upload URL for a new object key
+  2. client PUTs the bytes to that URL (straight to S3 on the s3 backend)
+  3. POST /media/uploads/{key}/complete -> object is copied to its final key (ready-<key>), validated
+     there and its media_url returned
+The upload URL stays valid until it expires, so the validated copy lives at a key no upload URL covers;
+re-PUTting to the upload key afterwards changes nothing that messages reference.
+POST /media/upload (multipart, bytes proxied through the app) is kept for older clients.
 """
-import os
+import asyncio
 import uuid
-from pathlib import Path
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, RedirectResponse
+from sqlalchemy.orm import Session
 
+from app.core.config import get_settings
 from app.core.security import get_current_user
+from app.db.database import SessionLocal, get_db
+from app.models.media import MediaObject
 from app.models.user import User
+from app.schemas.media import UploadRequest, UploadResult, UploadTicket
+from app.storage import StorageError, get_storage
+from app.storage.factory import get_uploads_dir  # noqa: F401 - kept for existing imports
 
 router = APIRouter(prefix="/media", tags=["Media"])
 
@@ -22,14 +37,185 @@ EXT_BY_TYPE = {
     "image/webp": ".webp",
 }
 MAX_SIZE_MB = 10
+MAX_SIZE_BYTES = MAX_SIZE_MB * 1024 * 1024
+
+# Bytes read from a stored object to check it really is the declared image type
+SNIFF_BYTES = 16
+READY_PREFIX = "ready-"
+
+
+def sniff_image_type(head: bytes):
+    """Return the image content type from magic bytes, or None if not a supported image."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"GIF87a") or head.startswith(b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _check_content_type(content_type: str) -> None:
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_CONTENT_TYPES)}",
+        )
 
 
-def get_uploads_dir() -> Path:
-    """Directory for uploaded files (backend/uploads). Created if missing."""
-    base = Path(__file__).resolve().parents[2]  # backend/
-    uploads = base / "uploads"
-    uploads.mkdir(parents=True, exist_ok=True)
-    return uploads
+def _new_key(content_type: str) -> str:
+    return f"{uuid.uuid4().hex}{EXT_BY_TYPE.get(content_type, '.jpg')}"
+
+
+def _ready_key(key: str) -> str:
+    """Final key of a completed upload: never handed out for uploading."""
+    return f"{READY_PREFIX}{key}"
+
+
+@router.post("/uploads", response_model=UploadTicket)
+def create_upload(
+    body: UploadRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Start an upload: returns a presigned URL the client PUTs the image bytes to (with the given
+    headers), then the client calls POST /media/uploads/{key}/complete.
+    """
+    _check_content_type(body.content_type)
+    if body.size <= 0 or body.size > MAX_SIZE_BYTES:
+        raise HTTPException(status_code=400, detail=f"File too large. Max {MAX_SIZE_MB} MB.")
+    key = _new_key(body.content_type)
+    db.add(MediaObject(key=key, owner_id=current_user.id, content_type=body.content_type))
+    db.commit()
+    expires_in = get_settings().MEDIA_PRESIGN_EXPIRE_SECONDS
+    upload_url = get_storage().presign_upload(key, body.content_type, expires_in)
+    return UploadTicket(
+        key=key,
+        upload_url=upload_url,
+        headers={"Content-Type": body.content_type},
+        expires_in=expires_in,
+    )
+
+
+@router.post("/uploads/{key}/complete", response_model=UploadResult)
+def complete_upload(
+    key: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Copy an uploaded object to its final key, validate the copy (within size limit, bytes match the
+    declared image type) and mark it ready. Returns the media_url to send in chat messages.
+    Invalid objects are deleted. Calling it again for a completed upload returns the same media_url.
+    """
+    ready_key = _ready_key(key)
+    media = db.query(MediaObject).filter(MediaObject.key.in_([key, ready_key])).first()
+    if media is None or media.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    storage = get_storage()
+    if media.status == MediaObject.STATUS_READY:
+        return UploadResult(url=storage.public_path(media.key))
+    try:
+        storage.copy(key, ready_key)
+        obj = storage.stat(ready_key)
+        head = storage.read_head(ready_key, SNIFF_BYTES)
+    except StorageError:
+        raise HTTPException(status_code=400, detail="Uploaded object not found")
+    storage.delete(key)
+    if obj.size > MAX_SIZE_BYTES or sniff_image_type(head) != media.content_type:
+        storage.delete(ready_key)
+        db.delete(media)
+        db.commit()
+        raise HTTPException(status_code=400, detail="Uploaded object is not a valid image of the declared type")
+    media.key = ready_key
+    media.size = obj.size
+    media.status = MediaObject.STATUS_READY
+    db.commit()
+    return UploadResult(url=storage.public_path(ready_key))
+
+
+def _is_pending_upload(key: str) -> bool:
+    """True if key was handed out by POST /media/uploads and not completed yet. Blocking."""
+    db = SessionLocal()
+    try:
+        return db.query(MediaObject.id).filter(
+            MediaObject.key == key, MediaObject.status == MediaObject.STATUS_PENDING
+        ).first() is not None
+    finally:
+        db.close()
+
+
+async def _read_body_capped(request: Request, limit: int) -> bytes:
+    """Request body, streamed; 400 as soon as it exceeds limit bytes."""
+    too_large = HTTPException(status_code=400, detail=f"File too large. Max {MAX_SIZE_MB} MB.")
+    try:
+        declared = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    if declared > limit:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise too_large
+    return bytes(body)
+
+
+@router.put("/local-upload/{key}", include_in_schema=False)
+async def local_upload(
+    key: str,
+    request: Request,
+    expires: int = Query(...),
+    signature: str = Query(...),
+):
+    """Target of presigned upload URLs on the local backend. Authorized by the URL signature."""
+    storage = get_storage()
+    if storage.name != "local":
+        raise HTTPException(status_code=404, detail="Not found")
+    try:
+        storage.verify_signature(key, expires, signature)
+    except StorageError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    # The URL stays valid after /complete: only pending uploads may still be written
+    if not await asyncio.to_thread(_is_pending_upload, key):
+        raise HTTPException(status_code=409, detail="Upload already completed or unknown")
+    contents = await _read_body_capped(request, MAX_SIZE_BYTES)
+    content_type = request.headers.get("content-type", "")
+    await asyncio.to_thread(storage.put, key, contents, content_type)
+    return {"key": key}
+
+
+@router.get("/files/{key}")
+def get_media_file(key: str, db: Session = Depends(get_db)):
+    """Redirect to a short-lived download URL for a ready object (used as media_url on the s3 backend)."""
+    ready = db.query(MediaObject.id).filter(
+        MediaObject.key == key, MediaObject.status == MediaObject.STATUS_READY
+    ).first()
+    if ready is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    storage = get_storage()
+    url = storage.presign_download(key, get_settings().MEDIA_PRESIGN_EXPIRE_SECONDS)
+    return RedirectResponse(url, status_code=307)
+
+
+def _record_upload(key: str, owner_id: int, content_type: str, size: int) -> None:
+    """Store the MediaObject row of a proxied upload (already validated). Blocking."""
+    db = SessionLocal()
+    try:
+        db.add(MediaObject(
+            key=key,
+            owner_id=owner_id,
+            content_type=content_type,
+            size=size,
+            status=MediaObject.STATUS_READY,
+        ))
+        db.commit()
+    finally:
+        db.close()
 
 
 @router.post("/upload")
@@ -38,27 +224,20 @@ async def upload_image(
     current_user: User = Depends(get_current_user),
 ):
     """
-    Upload an image for chat. Returns URL path to use in messages (e.g. /uploads/xxx.jpg).
-    Max size 10 MB. Allowed: JPEG, PNG, GIF, WebP.
+    Upload an image for chat (bytes pass through the app). Returns URL path to use in messages.
+    Max size 10 MB. Allowed: JPEG, PNG, GIF, WebP. Prefer POST /media/uploads for direct uploads.
     """
     content_type = file.content_type or ""
-    if content_type not in ALLOWED_CONTENT_TYPES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_CONTENT_TYPES)}",
-        )
-    ext = EXT_BY_TYPE.get(content_type, ".jpg")
-    unique_name = f"{uuid.uuid4().hex}{ext}"
-    uploads_dir = get_uploads_dir()
-    file_path = uploads_dir / unique_name
-
+    _check_content_type(content_type)
     contents = await file.read()
-    if len(contents) > MAX_SIZE_MB * 1024 * 1024:
+    if len(contents) > MAX_SIZE_BYTES:
         raise HTTPException(status_code=400, detail=f"File too large. Max {MAX_SIZE_MB} MB.")
+    if sniff_image_type(contents[:SNIFF_BYTES]) != content_type:
+        raise HTTPException(status_code=400, detail="File is not a valid image of the declared type")
 
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    key = _new_key(content_type)
+    storage = get_storage()
+    await asyncio.to_thread(storage.put, key, contents, content_type)
+    await asyncio.to_thread(_record_upload, key, current_user.id, content_type, len(contents))
 
-    # Return path that the frontend can use: base URL + /uploads/unique_name
-    url_path = f"/uploads/{unique_name}"
-    return JSONResponse(content={"url": url_path})
+    return JSONResponse(content={"url": storage.public_path(key)})
@@ -2,45 +2,103 @@
 REST API for messages. Use GET to verify messages are saved (see in Network tab).
 Sending is done via WebSocket; this endpoint is for listing only.
 """
+from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
+from app.db import message_io
+from app.db.message_cache import message_cache
+from app.db.shards import shards
 from app.models.message import Message
 from app.models.user import User
 from app.schemas.message import MessageResponse
 from app.core.security import get_current_user
+from app.core.versions import CACHE_CONTROL, conversation_key, etag_matches, inbox_key, versions
 
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
 
 @router.get("/", response_model=list[MessageResponse])
 def list_messages(
+    response: Response,
     with_user_id: Optional[int] = Query(None, description="Filter to conversation with this user ID"),
     limit: int = Query(100, ge=1, le=500),
+    before_id: Optional[int] = Query(None, description="Older page: only messages with id below this"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     List messages where current user is sender or receiver.
     Optional: ?with_user_id=2 to see only messages with that user.
+    Page back with ?before_id=<oldest id received> (ids are per shard, so use it with with_user_id when sharded).
     You can call this from the browser (Network tab) or Swagger to verify DB has data.
+    Supports conditional GET: send the returned ETag as If-None-Match to get 304 when nothing changed.
     """
-    q = db.query(Message).filter(
-        or_(
-            Message.sender_id == current_user.id,
-            Message.receiver_id == current_user.id,
-        )
-    )
     if with_user_id is not None:
-        q = q.filter(
-            or_(
-                (Message.sender_id == current_user.id) & (Message.receiver_id == with_user_id),
-                (Message.receiver_id == current_user.id) & (Message.sender_id == with_user_id),
+        version_key = conversation_key(current_user.id, with_user_id)
+    else:
+        version_key = inbox_key(current_user.id)
+    version = versions.get(version_key)
+    etag = versions.etag(version_key, version, current_user.id, with_user_id, limit, before_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    # First page of a conversation: served from the in-memory hot tail when it holds enough messages
+    first_page = with_user_id is not None and before_id is None
+    if first_page:
+        cached = message_cache.get(current_user.id, with_user_id, limit, version)
+        if cached is not None:
+            return cached
+    fetch = message_cache.fill_limit(limit) if first_page else limit
+    results = []
+    # Shard-local when with_user_id is given; otherwise each shard returns its newest `limit` rows
+    with shards.sessions(db, current_user.id, with_user_id) as sessions:
+        for session in sessions:
+            q = session.query(Message).filter(
+                or_(
+                    Message.sender_id == current_user.id,
+                    Message.receiver_id == current_user.id,
+                )
             )
-        )
-    q = q.order_by(Message.created_at.desc()).limit(limit)
-    return q.all()
+            if with_user_id is not None:
+                q = q.filter(
+                    or_(
+                        (Message.sender_id == current_user.id) & (Message.receiver_id == with_user_id),
+                        (Message.receiver_id == current_user.id) & (Message.sender_id == with_user_id),
+                    )
+                )
+            if before_id is not None:
+                q = q.filter(Message.id < before_id)
+            q = q.order_by(Message.created_at.desc()).limit(fetch)
+            results.extend(q.all())
+    if len(sessions) > 1:
+        results.sort(key=lambda m: m.created_at or datetime.min, reverse=True)
+    if first_page:
+        message_cache.fill(current_user.id, with_user_id, results, fetch, version)
+    return results[:limit]
+
+
+@router.get("/export")
+def export_messages(
+    format: str = Query(message_io.FORMAT_NDJSON, pattern="^(ndjson|csv)$"),
+    with_user_id: Optional[int] = Query(None, description="Export only the conversation with this user ID"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Download all of the current user's messages (oldest first) as NDJSON or CSV.
+    Streamed from a server-side cursor, so memory stays flat regardless of history size.
+    """
+    rows = message_io.iter_messages(current_user.id, with_user_id)
+    filename = f"messages-{current_user.id}.{format}"
+    return StreamingResponse(
+        message_io.export_stream(format, rows),
+        media_type=message_io.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
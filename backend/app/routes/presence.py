@@ -0,0 +1,17 @@
+"""
+Presence snapshot for initial load. Afterwards /ws/chat pushes {"type": "presence", "online": [...],
+"offline": [...]} frames with changes (see app.websocket.presence).
+"""
+from fastapi import APIRouter, Depends
+
+from app.core.security import get_current_user
+from app.models.user import User
+from app.websocket.presence import presence
+
+router = APIRouter(prefix="/presence", tags=["Presence"])
+
+
+@router.get("/")
+def get_presence(current_user: User = Depends(get_current_user)):
+    """Ids of users the current user has a conversation with that are online right now."""
+    return {"online": presence.snapshot(current_user.id)}
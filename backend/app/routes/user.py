@@ -1,8 +1,10 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Body, status
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app.db.database import get_db
+from app.db.message_cache import message_cache
+from app.db.shards import shards
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
 from app.core.security import (
@@ -10,7 +12,12 @@ from app.core.security import (
     create_access_token,
     verify_password,
     get_current_user,
+    decode_access_token,
+    oauth2_scheme,
 )
+from app.core.revocation import revocations
+from app.core.versions import CACHE_CONTROL, DIRECTORY, conversation_key, etag_matches, inbox_key, versions
+from app.websocket.presence import load_peers
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -32,6 +39,7 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     )
     db.add(new_user)
     db.commit()
+    versions.bump(DIRECTORY)
     db.refresh(new_user)
     return new_user
 
@@ -65,11 +73,21 @@ def login_token(
 
 @router.get("/", response_model=list[UserResponse])
 def get_all_users(
+    response: Response,
     status_filter: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
 ):
-    """List users (auth required). Optional query: ?status_filter=1 for active, 0 for inactive."""
+    """
+    List users (auth required). Optional query: ?status_filter=1 for active, 0 for inactive.
+    Supports conditional GET: send the returned ETag as If-None-Match to get 304 when nothing changed.
+    """
+    etag = versions.etag(DIRECTORY, versions.get(DIRECTORY), status_filter)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
     query = db.query(User)
     if status_filter is not None:
         query = query.filter(User.status == status_filter)
@@ -118,6 +136,10 @@ def update_user(
     if user_update.password is not None:
         user.password = hash_password(user_update.password)
     db.commit()
+    versions.bump(DIRECTORY)
+    # Password change or deactivation ends every existing session (REST and live WebSockets)
+    if user_update.password is not None or user.status != User.STATUS_ACTIVE:
+        revocations.revoke_user(user.id)
     db.refresh(user)
     return user
 
@@ -137,8 +159,19 @@ def delete_user(
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    # Their messages go too: every peer's conversation with them and inbox change as well
+    peers = load_peers([user_id])[user_id]
+    shards.delete_user_messages(user_id)
     db.delete(user)
     db.commit()
+    versions.bump(
+        DIRECTORY,
+        inbox_key(user_id),
+        *(conversation_key(user_id, peer_id) for peer_id in peers),
+        *(inbox_key(peer_id) for peer_id in peers),
+    )
+    revocations.revoke_user(user_id)
+    message_cache.forget_user(user_id)
     return {"message": "User deleted successfully"}
 
 
@@ -165,7 +198,13 @@ def login(
 
 
 @router.post("/logout")
-def logout(current_user: User = Depends(get_current_user)):
-    """Logout the current user."""
+def logout(
+    token: str = Depends(oauth2_scheme),
+    current_user: User = Depends(get_current_user),
+):
+    """Logout the current user: revokes this access token (REST and any WebSocket opened with it)."""
+    payload = decode_access_token(token)
+    if payload is not None:
+        revocations.revoke_token(payload)
     return {"message": "Logged out successfully"}
 
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+
+
+class UploadRequest(BaseModel):
+    content_type: str
+    size: int  # bytes the client is about to upload
+
+
+class UploadTicket(BaseModel):
+    key: str
+    upload_url: str  # absolute (S3) or path relative to the API base (local backend)
+    method: str = "PUT"
+    headers: dict[str, str]
+    expires_in: int
+
+
+class UploadResult(BaseModel):
+    url: str  # value to send as media_url
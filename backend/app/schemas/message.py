@@ -1,5 +1,7 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
+
+from app.db.compression import message_codec
 
 
 class MessageResponse(BaseModel):
@@ -9,6 +11,16 @@ class MessageResponse(BaseModel):
     content: str
     media_url: str | None = None
     created_at: datetime
+    client_msg_id: str | None = None
 
     class Config:
         from_attributes = True
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def decompress_content(cls, data, handler):
+        """Compressed rows (content_codec set) are decoded here, when serialized, and nowhere earlier."""
+        message = handler(data)
+        if getattr(data, "content_codec", None) is not None:
+            message = message.model_copy(update={"content": message_codec.text(data)})
+        return message
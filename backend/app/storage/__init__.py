@@ -0,0 +1,5 @@
+# Media storage backends (local filesystem, S3-compatible)
+from app.storage.base import StorageBackend, StoredObject, StorageError
+from app.storage.factory import get_storage
+
+__all__ = ["StorageBackend", "StoredObject", "StorageError", "get_storage"]
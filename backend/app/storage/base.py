@@ -0,0 +1,58 @@
+"""
+Storage backend interface for chat media. Routes only deal with object keys and metadata; where the
+bytes live (local disk, S3 bucket) and how clients reach them (presigned URLs) is up to the backend.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+
+class StorageError(Exception):
+    """Raised by backends when an object operation fails (missing object, bad signature, I/O error)."""
+
+
+@dataclass
+class StoredObject:
+    """Metadata of an object as reported by the backend."""
+
+    key: str
+    size: int
+    content_type: Optional[str] = None
+
+
+class StorageBackend(ABC):
+    """Base class for media storage backends. All methods are blocking; call from a worker thread."""
+
+    name = "base"
+
+    @abstractmethod
+    def presign_upload(self, key: str, content_type: str, expires_in: int) -> str:
+        """URL the client PUTs the object bytes to (with Content-Type set), valid for expires_in seconds."""
+
+    @abstractmethod
+    def presign_download(self, key: str, expires_in: int) -> str:
+        """URL the client GETs the object from, valid for expires_in seconds."""
+
+    @abstractmethod
+    def public_path(self, key: str) -> str:
+        """Stable path stored as Message.media_url for this object."""
+
+    @abstractmethod
+    def stat(self, key: str) -> StoredObject:
+        """Return size/content type of an object. Raises StorageError if it does not exist."""
+
+    @abstractmethod
+    def read_head(self, key: str, length: int) -> bytes:
+        """Return the first length bytes of an object (for content sniffing)."""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        """Store an object directly (used by the legacy proxied upload endpoint)."""
+
+    @abstractmethod
+    def copy(self, src_key: str, dst_key: str) -> None:
+        """Copy an object to a new key. Raises StorageError if the source does not exist."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Delete an object; missing objects are ignored."""
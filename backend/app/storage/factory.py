@@ -0,0 +1,35 @@
+from functools import lru_cache
+from pathlib import Path
+
+from app.core.config import get_settings
+from app.storage.base import StorageBackend
+
+
+def get_uploads_dir() -> Path:
+    """Directory for locally stored files (backend/uploads). Created if missing."""
+    base = Path(__file__).resolve().parents[2]  # backend/
+    uploads = base / "uploads"
+    uploads.mkdir(parents=True, exist_ok=True)
+    return uploads
+
+
+@lru_cache
+def get_storage() -> StorageBackend:
+    """Configured media storage backend (MEDIA_STORAGE_BACKEND=local|s3). Cached per process."""
+    s = get_settings()
+    backend = (s.MEDIA_STORAGE_BACKEND or "local").lower()
+    if backend == "s3":
+        from app.storage.s3 import S3Storage
+
+        return S3Storage(
+            bucket=s.S3_BUCKET,
+            endpoint_url=s.S3_ENDPOINT_URL,
+            region=s.S3_REGION,
+            access_key_id=s.S3_ACCESS_KEY_ID,
+            secret_access_key=s.S3_SECRET_ACCESS_KEY,
+        )
+    if backend != "local":
+        raise RuntimeError(f"Unknown MEDIA_STORAGE_BACKEND: {backend!r} (expected 'local' or 's3')")
+    from app.storage.local import LocalStorage
+
+    return LocalStorage(get_uploads_dir(), s.SECRET_KEY)
@@ -0,0 +1,79 @@
+"""
+Local filesystem storage (default). Objects live under backend/uploads/ and are served by the /uploads
+static mount. Presigned upload URLs point at the app's own signed PUT endpoint, so on this backend the
+bytes still pass through a worker; use the S3 backend to take them off the app entirely.
+"""
+import hashlib
+import hmac
+import shutil
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from app.storage.base import StorageBackend, StoredObject, StorageError
+
+# Path of the signed PUT endpoint in app.routes.media (mounted under /api/v1)
+LOCAL_UPLOAD_PATH = "/api/v1/media/local-upload"
+
+
+class LocalStorage(StorageBackend):
+    name = "local"
+
+    def __init__(self, root: Path, secret_key: str):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._secret = secret_key.encode("utf-8")
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if path.parent != self.root.resolve():
+            raise StorageError(f"Invalid object key: {key!r}")
+        return path
+
+    def sign(self, key: str, expires: int) -> str:
+        msg = f"{key}:{expires}".encode("utf-8")
+        return hmac.new(self._secret, msg, hashlib.sha256).hexdigest()
+
+    def verify_signature(self, key: str, expires: int, signature: str) -> None:
+        """Check a presigned upload URL. Raises StorageError if expired or tampered with."""
+        if expires < int(time.time()):
+            raise StorageError("Upload URL expired")
+        if not hmac.compare_digest(self.sign(key, expires), signature):
+            raise StorageError("Invalid upload signature")
+
+    def presign_upload(self, key: str, content_type: str, expires_in: int) -> str:
+        expires = int(time.time()) + expires_in
+        query = urlencode({"expires": expires, "signature": self.sign(key, expires)})
+        return f"{LOCAL_UPLOAD_PATH}/{key}?{query}"
+
+    def presign_download(self, key: str, expires_in: int) -> str:
+        return self.public_path(key)  # /uploads is a public static mount
+
+    def public_path(self, key: str) -> str:
+        return f"/uploads/{key}"
+
+    def stat(self, key: str) -> StoredObject:
+        path = self._path(key)
+        if not path.is_file():
+            raise StorageError(f"Object not found: {key}")
+        return StoredObject(key=key, size=path.stat().st_size)
+
+    def read_head(self, key: str, length: int) -> bytes:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read(length)
+        except OSError as e:
+            raise StorageError(str(e)) from e
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        with open(self._path(key), "wb") as f:
+            f.write(data)
+
+    def copy(self, src_key: str, dst_key: str) -> None:
+        try:
+            shutil.copyfile(self._path(src_key), self._path(dst_key))
+        except OSError as e:
+            raise StorageError(str(e)) from e
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
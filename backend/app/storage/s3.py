@@ -0,0 +1,94 @@
+"""
+S3-compatible storage (AWS S3, MinIO, R2, ...). Clients PUT/GET bytes directly via presigned URLs, so
+app workers only handle metadata. For local testing point S3_ENDPOINT_URL at a MinIO container.
+Requires boto3 (optional dependency): pip install boto3
+"""
+from typing import Optional
+
+from app.storage.base import StorageBackend, StoredObject, StorageError
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import BotoCoreError, ClientError
+except ImportError:  # pragma: no cover - only needed when MEDIA_STORAGE_BACKEND=s3
+    boto3 = None
+
+
+class S3Storage(StorageBackend):
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+    ):
+        if boto3 is None:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 requires boto3. Run: pip install boto3")
+        if not bucket:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 requires S3_BUCKET")
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key_id or None,
+            aws_secret_access_key=secret_access_key or None,
+            # Path-style addressing works with MinIO and other local stand-ins
+            config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    def presign_upload(self, key: str, content_type: str, expires_in: int) -> str:
+        return self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires_in,
+        )
+
+    def presign_download(self, key: str, expires_in: int) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expires_in,
+        )
+
+    def public_path(self, key: str) -> str:
+        # Redirects to a fresh presigned GET (see app.routes.media.get_media_file)
+        return f"/api/v1/media/files/{key}"
+
+    def stat(self, key: str) -> StoredObject:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(f"Object not found: {key} ({e})") from e
+        return StoredObject(key=key, size=head["ContentLength"], content_type=head.get("ContentType"))
+
+    def read_head(self, key: str, length: int) -> bytes:
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes=0-{length - 1}")
+            return obj["Body"].read()
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(str(e)) from e
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(str(e)) from e
+
+    def copy(self, src_key: str, dst_key: str) -> None:
+        try:
+            self.client.copy_object(
+                Bucket=self.bucket, Key=dst_key, CopySource={"Bucket": self.bucket, "Key": src_key}
+            )
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(str(e)) from e
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+        except (BotoCoreError, ClientError) as e:
+            raise StorageError(str(e)) from e
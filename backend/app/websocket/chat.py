@@ -1,15 +1,177 @@
+import asyncio
 import logging
+from datetime import datetime
+from typing import Optional, Tuple
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from sqlalchemy.exc import IntegrityError
 
+from app.db.compression import message_codec
 from app.db.database import SessionLocal
+from app.db.message_cache import message_cache
+from app.db.shards import shards
 from app.models.message import Message
+from app.models.media import MediaObject, key_from_media_url
+from app.storage import get_storage
 from app.websocket.manager import manager
+from app.websocket.dedup import CLIENT_MSG_ID_MAX_LENGTH, recent_message_ids
+from app.websocket.heartbeat import heartbeat
+from app.websocket.presence import presence
+from app.websocket.ephemeral import MAX_ID, TYPING_START, TYPING_STOP, typing_debouncer, read_receipts
 from app.core.security import decode_access_token
+from app.core.revocation import revocations
+from app.core.versions import versions
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Frame types on /ws/chat. Frames without "type" are chat messages (original protocol).
+FRAME_MESSAGE = "message"
+FRAME_TYPING = "typing"
+FRAME_READ = "read"
+FRAME_ACK = "ack"
+FRAME_PONG = "pong"  # reply to the heartbeat's {"type": "ping"}
+
+ACK_OK = "ok"
+ACK_DUPLICATE = "duplicate"
+ACK_ERROR = "error"
+
+
+def ack_frame(client_msg_id: Optional[str], status: str, message_id: Optional[int] = None,
+              created_at: Optional[datetime] = None, detail: Optional[str] = None) -> dict:
+    """Build the ack sent back to the sender for every chat message frame."""
+    frame = {"type": FRAME_ACK, "client_msg_id": client_msg_id, "status": status}
+    if message_id is not None:
+        frame["id"] = message_id
+        frame["created_at"] = created_at.isoformat() if created_at else None
+    if detail:
+        frame["detail"] = detail
+    return frame
+
+
+class InvalidMediaError(Exception):
+    """media_url does not refer to an upload that passed POST /media/uploads/{key}/complete."""
+
+
+def media_is_ready(media_url: str) -> bool:
+    """
+    True if media_url is exactly the path the storage backend gives out for an upload validated by
+    POST /media/uploads/{key}/complete (not just any URL ending in its key).
+    """
+    key = key_from_media_url(media_url)
+    if key is None or media_url != get_storage().public_path(key):
+        return False
+    db = SessionLocal()
+    try:
+        ready = (
+            db.query(MediaObject.id)
+            .filter(MediaObject.key == key, MediaObject.status == MediaObject.STATUS_READY)
+            .first()
+        )
+        return ready is not None
+    finally:
+        db.close()
+
+
+def save_message(sender_id: int, receiver_id: int, content: str, media_url: Optional[str],
+                 client_msg_id: Optional[str]) -> Tuple[int, datetime, bool]:
+    """
+    Insert one message. Returns (id, created_at, duplicate). A retry that hits the
+    (sender_id, client_msg_id) unique constraint returns the original row with duplicate=True.
+    Raises InvalidMediaError if media_url is not a validated upload. Other DB errors propagate.
+    Blocking: /ws/chat runs it in a worker thread.
+    """
+    if media_url is not None and not media_is_ready(media_url):
+        raise InvalidMediaError(media_url)
+    # Messages live on the conversation's shard (the primary DB unless MESSAGE_SHARD_URLS is set)
+    db = shards.session_for(sender_id, receiver_id)
+    try:
+        stored, compressed, codec = message_codec.encode(content)
+        msg = Message(
+            sender_id=sender_id,
+            receiver_id=receiver_id,
+            content=stored,
+            content_compressed=compressed,
+            content_codec=codec,
+            media_url=media_url,
+            client_msg_id=client_msg_id,
+        )
+        db.add(msg)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            if client_msg_id is None:
+                raise
+            existing = (
+                db.query(Message)
+                .filter(Message.sender_id == sender_id, Message.client_msg_id == client_msg_id)
+                .first()
+            )
+            if existing is None:
+                raise
+            # A retry after the bump below failed lands here: bump now so no stale 304 is served
+            _bump_versions(sender_id, receiver_id)
+            return existing.id, existing.created_at, True
+        version = _bump_versions(sender_id, receiver_id)
+        if version is not None:
+            message_cache.append(msg, version, content)
+        return msg.id, msg.created_at, False
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _bump_versions(sender_id: int, receiver_id: int) -> Optional[int]:
+    """
+    Best-effort versions.bump_message once the message is committed: it is stored either way, so a
+    failure must not turn into an error ack. Returns the new conversation version, or None on failure.
+    """
+    try:
+        return versions.bump_message(sender_id, receiver_id)
+    except Exception as e:
+        # The cached tail would now miss the message; ETags catch up with the conversation's next change
+        logger.exception("Version bump failed for conversation %s-%s: %s", sender_id, receiver_id, e)
+        message_cache.discard(sender_id, receiver_id)
+        return None
+
+
+async def handle_typing(user_id: int, data: dict) -> None:
+    """Forward a debounced typing start/stop to the receiver. Never touches the DB."""
+    try:
+        receiver_id = int(data.get("receiver_id"))
+    except (TypeError, ValueError):
+        return
+    state = data.get("state", TYPING_START)
+    if state not in (TYPING_START, TYPING_STOP):
+        return
+    if not typing_debouncer.should_forward(user_id, receiver_id, state):
+        return
+    await manager.send_personal_message(
+        {"type": FRAME_TYPING, "user_id": user_id, "state": state},
+        receiver_id,
+    )
+
+
+async def handle_read(user_id: int, data: dict) -> None:
+    """Coalesce a read receipt (buffered for batch write) and tell the peer if it advanced."""
+    try:
+        peer_id = int(data.get("peer_id"))
+        message_id = int(data.get("message_id"))
+    except (TypeError, ValueError):
+        return
+    # Values the read_receipts row could not hold would only fail the batch write later
+    if not (0 < peer_id <= MAX_ID and 0 < message_id <= MAX_ID) or peer_id == user_id:
+        return
+    if not read_receipts.record(user_id, peer_id, message_id):
+        return
+    await manager.send_personal_message(
+        {"type": FRAME_READ, "user_id": user_id, "message_id": message_id},
+        peer_id,
+    )
+
 
 @router.websocket("/ws/chat")
 async def websocket_endpoint(
@@ -26,6 +188,8 @@ async def websocket_endpoint(
     user_id = int(payload.get("sub"))
     logger.info("WS /ws/chat: user_id=%s connected", user_id)
     await manager.connect(user_id, websocket)
+    conn = heartbeat.register(user_id, websocket)
+    revocations.track_socket(websocket, payload)
 
     try:
         while True:
@@ -35,11 +199,32 @@ async def websocket_endpoint(
                 # Connection closed or broken; exit loop so we stop calling receive()
                 logger.info("WS user_id=%s connection closed: %s", user_id, e)
                 break
+            heartbeat.touch(conn)
+            if not isinstance(data, dict):
+                continue
+            frame_type = data.get("type", FRAME_MESSAGE)
+            if frame_type == FRAME_PONG:
+                continue
+            if frame_type == FRAME_TYPING:
+                await handle_typing(user_id, data)
+                continue
+            if frame_type == FRAME_READ:
+                await handle_read(user_id, data)
+                continue
+            if frame_type != FRAME_MESSAGE:
+                continue
+            client_msg_id = data.get("client_msg_id")
+            if client_msg_id is not None:
+                client_msg_id = str(client_msg_id).strip() or None
+            if client_msg_id is not None and len(client_msg_id) > CLIENT_MSG_ID_MAX_LENGTH:
+                await websocket.send_json(ack_frame(None, ACK_ERROR, detail="client_msg_id too long"))
+                continue
             try:
                 receiver_id = int(data.get("receiver_id"))
             except (TypeError, ValueError) as e:
                 logger.warning("WS invalid receiver_id from user_id=%s: %s", user_id, e)
                 print(f"[WS] invalid receiver_id from user_id={user_id}: {data!r}")  # visible in terminal
+                await websocket.send_json(ack_frame(client_msg_id, ACK_ERROR, detail="invalid receiver_id"))
                 continue
             content = str(data.get("message", "")).strip()
             media_url = data.get("media_url")
@@ -48,39 +233,69 @@ async def websocket_endpoint(
             else:
                 media_url = None
             if not content and not media_url:
+                await websocket.send_json(ack_frame(client_msg_id, ACK_ERROR, detail="empty message"))
                 continue
 
+            # Retry of a message this worker already stored: re-ack from memory, don't insert or forward again
+            if client_msg_id is not None:
+                recent = recent_message_ids.get(user_id, client_msg_id)
+                if recent is not None:
+                    await websocket.send_json(ack_frame(client_msg_id, ACK_DUPLICATE, *recent))
+                    continue
+
             logger.info("WS message received: sender_id=%s receiver_id=%s content=%r media_url=%s", user_id, receiver_id, content[:50] if content else "", media_url)
             content_preview = (content[:50] if content else "(media)")
             print(f"[WS] message received: sender={user_id} receiver={receiver_id} content={content_preview!r} media_url={media_url!r}")
 
-            # Store message in database (individual message table)
-            db = SessionLocal()
+            # Store message in database (individual message table). Blocking (media check, shard insert,
+            # version bump): run in a worker thread so other sockets keep being served meanwhile
             try:
-                msg = Message(
-                    sender_id=user_id,
-                    receiver_id=receiver_id,
-                    content=content or "",
-                    media_url=media_url,
+                message_id, created_at, duplicate = await asyncio.to_thread(
+                    save_message, user_id, receiver_id, content or "", media_url, client_msg_id
                 )
-                db.add(msg)
-                db.commit()
-                logger.info("WS message saved to DB id=%s", msg.id)
-                print(f"[WS] message SAVED to DB id={msg.id}")  # visible in terminal
+                logger.info("WS message saved to DB id=%s duplicate=%s", message_id, duplicate)
+                print(f"[WS] message SAVED to DB id={message_id}")  # visible in terminal
+            except InvalidMediaError:
+                logger.warning("WS message with unvalidated media_url from user_id=%s: %s", user_id, media_url)
+                await websocket.send_json(ack_frame(client_msg_id, ACK_ERROR, detail="media not found"))
+                continue
             except Exception as e:
                 logger.exception("WS message DB save failed: %s", e)
                 print(f"[WS] DB SAVE FAILED: {e}")  # visible in terminal
-                db.rollback()
-            finally:
-                db.close()
+                # Not stored and not delivered; the client may retry with the same client_msg_id
+                await websocket.send_json(ack_frame(client_msg_id, ACK_ERROR, detail="message not saved"))
+                continue
+
+            if client_msg_id is not None:
+                recent_message_ids.add(user_id, client_msg_id, message_id, created_at)
+            await websocket.send_json(
+                ack_frame(client_msg_id, ACK_DUPLICATE if duplicate else ACK_OK, message_id, created_at)
+            )
+            # A duplicate found in the DB (not in recent_message_ids) may be a retry of an attempt that
+            # stored the row but never forwarded it (e.g. the sender got an error ack or the worker
+            # restarted), so forward it again; receivers drop message ids they already have.
+
+            # A sent message ends the sender's typing state for this pair
+            typing_debouncer.clear(user_id, receiver_id)
+            presence.add_conversation(user_id, receiver_id)
 
             # Send to receiver in real time (JSON with content and optional media_url)
             await manager.send_personal_message(
-                {"sender_id": user_id, "content": content or "", "media_url": media_url},
+                {
+                    "id": message_id,
+                    "sender_id": user_id,
+                    "content": content or "",
+                    "media_url": media_url,
+                    "created_at": created_at.isoformat() if created_at else None,
+                },
                 receiver_id,
             )
 
     except WebSocketDisconnect:
         logger.info("WS /ws/chat: user_id=%s disconnected", user_id)
     finally:
-        manager.disconnect(user_id)
\ No newline at end of file
+        revocations.untrack_socket(websocket, payload)
+        heartbeat.unregister(conn)
+        manager.disconnect(user_id, websocket)
+        typing_debouncer.forget_user(user_id)
+        read_receipts.forget_user(user_id)
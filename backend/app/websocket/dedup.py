@@ -0,0 +1,45 @@
+"""
+Bounded window of recently persisted client message ids.
+
+A client that reconnects and retries in-flight messages resends the same client_msg_id. The window
+answers those retries from memory (same server id and timestamp as the first ack) without a DB round
+trip. Older duplicates fall through to the unique constraint on (sender_id, client_msg_id).
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+from app.core.config import get_settings
+
+# Upper bound on client_msg_id length; keep in sync with Message.client_msg_id
+CLIENT_MSG_ID_MAX_LENGTH = 64
+
+Entry = Tuple[int, datetime]  # (server message id, created_at)
+
+
+class RecentMessageIds:
+    """LRU map of (sender_id, client_msg_id) -> (server id, created_at), capped at max_size entries."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[int, str], Entry]" = OrderedDict()
+
+    def get(self, sender_id: int, client_msg_id: str) -> Optional[Entry]:
+        key = (sender_id, client_msg_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def add(self, sender_id: int, client_msg_id: str, message_id: int, created_at: datetime) -> None:
+        key = (sender_id, client_msg_id)
+        self._entries[key] = (message_id, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+recent_message_ids = RecentMessageIds(get_settings().WS_RECENT_CLIENT_IDS)
@@ -0,0 +1,179 @@
+"""
+Ephemeral WebSocket events: typing indicators and read receipts.
+
+These never touch the database on the hot path. Typing events are debounced per (sender, receiver)
+pair and only forwarded to the receiver. Read receipts are coalesced in memory to the highest message
+id per (reader, peer) and written to the read_receipts table in periodic batches by a background task.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core.config import get_settings
+from app.db.database import SessionLocal
+from app.models.read_receipt import ReadReceipt
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+TYPING_START = "start"
+TYPING_STOP = "stop"
+# Largest id an Integer column holds (int4 on PostgreSQL)
+MAX_ID = 2 ** 31 - 1
+
+Pair = Tuple[int, int]
+
+
+class TypingDebouncer:
+    """
+    Decides which typing events are worth forwarding. A "start" is forwarded when the pair was not
+    typing, or when the last forwarded "start" is older than the debounce interval (so the receiver's
+    indicator can time out on its own). A "stop" is forwarded only if a "start" was forwarded before.
+    """
+
+    def __init__(self, debounce_seconds: float):
+        self.debounce_seconds = debounce_seconds
+        self._last_start: Dict[Pair, float] = {}
+
+    def should_forward(self, sender_id: int, receiver_id: int, state: str, now: Optional[float] = None) -> bool:
+        key = (sender_id, receiver_id)
+        now = time.monotonic() if now is None else now
+        if state == TYPING_STOP:
+            return self._last_start.pop(key, None) is not None
+        last = self._last_start.get(key)
+        if last is not None and now - last < self.debounce_seconds:
+            return False
+        self._last_start[key] = now
+        return True
+
+    def clear(self, sender_id: int, receiver_id: int) -> None:
+        """Forget typing state for a pair (e.g. when the sender's real message went out)."""
+        self._last_start.pop((sender_id, receiver_id), None)
+
+    def forget_user(self, user_id: int) -> None:
+        """Drop all typing state where user_id is the sender (called on disconnect)."""
+        for key in [k for k in self._last_start if k[0] == user_id]:
+            del self._last_start[key]
+
+
+class ReadReceiptBuffer:
+    """
+    In-memory map of (reader_id, peer_id) -> highest read message id, flushed to storage in batches.
+    Only ids greater than what was already seen are kept, so a burst of receipts costs one row write.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Pair, int] = {}
+        self._seen: Dict[Pair, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, reader_id: int, peer_id: int, message_id: int) -> bool:
+        """Record a read receipt. Returns True if it advanced the read position (worth forwarding)."""
+        key = (reader_id, peer_id)
+        if message_id <= self._seen.get(key, 0):
+            return False
+        self._seen[key] = message_id
+        self._pending[key] = message_id
+        return True
+
+    def forget_user(self, user_id: int) -> None:
+        """Drop the forwarding high-water marks of a reader; pending writes are kept until flushed."""
+        for key in [k for k in self._seen if k[0] == user_id]:
+            del self._seen[key]
+
+    async def flush(self) -> int:
+        """
+        Write all pending receipts in one transaction (in a worker thread). Returns rows written.
+        If the database rejects a row, the batch is retried row by row and rejected rows are dropped;
+        other failures (e.g. database unreachable) keep the whole batch pending for the next flush.
+        """
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        try:
+            return await asyncio.to_thread(_write_read_receipts, batch)
+        except (IntegrityError, DataError) as e:
+            logger.warning("Read receipt batch rejected, writing row by row: %s", e)
+            written, failed = await asyncio.to_thread(_write_each, batch)
+        except Exception as e:
+            logger.exception("Read receipt flush failed, will retry: %s", e)
+            written, failed = 0, batch
+        self._requeue(failed)
+        return written
+
+    def _requeue(self, batch: Dict[Pair, int]) -> None:
+        for key, message_id in batch.items():
+            if message_id > self._pending.get(key, 0):
+                self._pending[key] = message_id
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def start(self, interval: float) -> None:
+        """Start the periodic flusher (idempotent). Call from app startup."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        """Stop the flusher and write whatever is still pending. Call from app shutdown."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+def _write_read_receipts(batch: Dict[Pair, int]) -> int:
+    """
+    Upsert a batch of read positions. Never moves a stored position backwards. Rows whose reader or
+    peer does not exist (e.g. deleted account) are dropped.
+    """
+    db = SessionLocal()
+    try:
+        user_ids = {user_id for pair in batch for user_id in pair}
+        known = {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(user_ids))}
+        batch = {pair: message_id for pair, message_id in batch.items() if known.issuperset(pair)}
+        reader_ids = {reader_id for reader_id, _ in batch}
+        existing = {
+            (r.user_id, r.peer_id): r
+            for r in db.query(ReadReceipt).filter(ReadReceipt.user_id.in_(reader_ids)).all()
+        }
+        for (reader_id, peer_id), message_id in batch.items():
+            row = existing.get((reader_id, peer_id))
+            if row is None:
+                db.add(ReadReceipt(user_id=reader_id, peer_id=peer_id, last_read_message_id=message_id))
+            elif message_id > row.last_read_message_id:
+                row.last_read_message_id = message_id
+        db.commit()
+        return len(batch)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _write_each(batch: Dict[Pair, int]) -> Tuple[int, Dict[Pair, int]]:
+    """Write receipts one transaction each, dropping rows the database rejects. Returns (written, rows to retry)."""
+    written, failed = 0, {}
+    for pair, message_id in batch.items():
+        try:
+            written += _write_read_receipts({pair: message_id})
+        except (IntegrityError, DataError) as e:
+            logger.warning("Dropping read receipt %s -> %s: %s", pair, message_id, e)
+        except Exception:
+            failed[pair] = message_id
+    return written, failed
+
+
+_settings = get_settings()
+typing_debouncer = TypingDebouncer(_settings.TYPING_DEBOUNCE_SECONDS)
+read_receipts = ReadReceiptBuffer()
@@ -0,0 +1,173 @@
+"""
+Application-level heartbeat for /ws/chat.
+
+Half-open TCP connections (typical on mobile networks) never make receive_json() fail, so they would
+sit in ConnectionManager.active_connections forever. One shared task drives a timing wheel: every
+connection sits in exactly one slot, and when its slot comes due it is either pinged, reaped (no frame
+received within the idle timeout) or rescheduled. Inbound frames only update a timestamp; the wheel
+re-files the connection lazily when its slot fires, so the hot path stays O(1) and there is no
+per-socket sleeping task.
+"""
+import asyncio
+import logging
+import math
+import time
+from typing import List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.core.config import get_settings
+from app.websocket.manager import manager
+
+logger = logging.getLogger(__name__)
+
+# Close code for connections reaped after the idle timeout (1001 = going away)
+IDLE_CLOSE_CODE = 1001
+# Max time a tick waits for its pings/closes so slow peers can't hold up the wheel
+SEND_TIMEOUT_SECONDS = 5.0
+PING_FRAME = {"type": "ping"}
+
+
+class Connection:
+    """Heartbeat state of one WebSocket. Identity-hashed so each connect gets its own wheel entry."""
+
+    __slots__ = ("user_id", "websocket", "last_seen", "active")
+
+    def __init__(self, user_id: int, websocket: WebSocket, now: float):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.last_seen = now
+        self.active = True
+
+
+class TimingWheel:
+    """Hashed timing wheel: a ring of slots advanced one slot per tick."""
+
+    def __init__(self, tick_seconds: float, num_slots: int):
+        self.tick_seconds = tick_seconds
+        self._slots: List[Set[Connection]] = [set() for _ in range(num_slots)]
+        self._position = 0
+
+    def schedule(self, conn: Connection, delay_seconds: float) -> None:
+        """File conn into the slot due after delay_seconds (capped at one revolution; re-checked on fire)."""
+        ticks = max(1, math.ceil(delay_seconds / self.tick_seconds))
+        ticks = min(ticks, len(self._slots) - 1)
+        self._slots[(self._position + ticks) % len(self._slots)].add(conn)
+
+    def advance(self) -> Set[Connection]:
+        """Move to the next slot and return the connections that are due."""
+        self._position = (self._position + 1) % len(self._slots)
+        due = self._slots[self._position]
+        self._slots[self._position] = set()
+        return due
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self._slots)
+
+
+class Heartbeat:
+    """Pings quiet connections and reaps those silent past the idle timeout."""
+
+    def __init__(self, ping_interval: float, idle_timeout: float, tick_seconds: float):
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        num_slots = math.ceil(max(ping_interval, idle_timeout) / tick_seconds) + 2
+        self.wheel = TimingWheel(tick_seconds, num_slots)
+        self.connections = 0
+        self.pings_sent = 0
+        self.reaped_total = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, user_id: int, websocket: WebSocket) -> Connection:
+        conn = Connection(user_id, websocket, time.monotonic())
+        self.wheel.schedule(conn, self.ping_interval)
+        self.connections += 1
+        return conn
+
+    @staticmethod
+    def touch(conn: Connection) -> None:
+        """Record inbound activity (any frame, including pong)."""
+        conn.last_seen = time.monotonic()
+
+    def unregister(self, conn: Connection) -> None:
+        """Mark conn closed; its wheel entry is dropped when its slot fires."""
+        if conn.active:
+            conn.active = False
+            self.connections -= 1
+
+    async def tick(self, now: Optional[float] = None) -> None:
+        """Process the next slot of the wheel."""
+        now = time.monotonic() if now is None else now
+        to_ping: List[Connection] = []
+        to_reap: List[Connection] = []
+        for conn in self.wheel.advance():
+            if not conn.active:
+                continue
+            idle = now - conn.last_seen
+            if idle >= self.idle_timeout:
+                to_reap.append(conn)
+            elif idle >= self.ping_interval:
+                to_ping.append(conn)
+                self.wheel.schedule(conn, self.idle_timeout - idle)
+            else:
+                self.wheel.schedule(conn, self.ping_interval - idle)
+        for conn in to_reap:
+            logger.info("WS heartbeat reaping idle user_id=%s", conn.user_id)
+            self.unregister(conn)
+            self.reaped_total += 1
+            manager.disconnect(conn.user_id, conn.websocket)
+        await self._send_all([conn.websocket.close(code=IDLE_CLOSE_CODE) for conn in to_reap])
+        self.pings_sent += await self._send_all([conn.websocket.send_json(PING_FRAME) for conn in to_ping])
+
+    @staticmethod
+    async def _send_all(sends: list) -> int:
+        """Run sends concurrently, bounded by SEND_TIMEOUT_SECONDS overall. Returns how many succeeded."""
+        if not sends:
+            return 0
+        tasks = [asyncio.ensure_future(send) for send in sends]
+        done, pending = await asyncio.wait(tasks, timeout=SEND_TIMEOUT_SECONDS)
+        for task in pending:
+            task.cancel()
+        # Failures are expected here (peer already gone); the reaper will catch the rest
+        return sum(1 for task in done if task.exception() is None)
+
+    async def _run(self) -> None:
+        # Fixed-rate schedule: if a tick (or a stalled loop) overruns, the next ticks run back to back
+        # so the wheel does not fall behind wall-clock time.
+        next_tick = time.monotonic() + self.wheel.tick_seconds
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            next_tick += self.wheel.tick_seconds
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.exception("WS heartbeat tick failed: %s", e)
+
+    def start(self) -> None:
+        """Start the shared heartbeat task (idempotent). Call from app startup."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "pings_sent": self.pings_sent,
+            "reaped_total": self.reaped_total,
+        }
+
+
+_settings = get_settings()
+heartbeat = Heartbeat(
+    ping_interval=_settings.WS_PING_INTERVAL_SECONDS,
+    idle_timeout=_settings.WS_IDLE_TIMEOUT_SECONDS,
+    tick_seconds=_settings.WS_HEARTBEAT_TICK_SECONDS,
+)
@@ -1,8 +1,10 @@
 import json
-from typing import Dict, Union
+from typing import Dict, Optional, Union
 
 from fastapi import WebSocket
 
+from app.websocket.presence import presence
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[int, WebSocket] = {}
@@ -10,9 +12,15 @@ class ConnectionManager:
     async def connect(self, user_id: int, websocket: WebSocket):
         await websocket.accept()
         self.active_connections[user_id] = websocket
+        presence.connected(user_id)
 
-    def disconnect(self, user_id: int):
-        self.active_connections.pop(user_id, None)
+    def disconnect(self, user_id: int, websocket: Optional[WebSocket] = None):
+        """Remove user's connection. With websocket given, only if it is still the current one
+        (a reconnect may already have replaced it)."""
+        if websocket is not None and self.active_connections.get(user_id) is not websocket:
+            return
+        if self.active_connections.pop(user_id, None) is not None:
+            presence.disconnected(user_id)
 
     async def send_personal_message(self, message: Union[str, dict], user_id: int):
         """Send text or JSON to one user. If message is dict, sends as JSON string."""
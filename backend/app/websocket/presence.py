@@ -0,0 +1,279 @@
+"""
+Presence: who is online, pushed to the users who care.
+
+ConnectionManager reports connects and disconnects here. Every PRESENCE_FLUSH_SECONDS a background task:
+  - applies this worker's changes to the user_presence table (one row per worker and online user) and
+    reads which of the users its local sockets watch (their conversation peers) other workers hold, so
+    online state is shared across workers without every worker reading every online user;
+  - diffs the combined online set against the last one and sends each local socket one "presence"
+    frame listing only the peers it has a conversation with that went online/offline.
+A disconnect counts as offline only after PRESENCE_OFFLINE_GRACE_SECONDS, so reconnects (page reload,
+flaky network) and connect/disconnect flaps inside one flush window produce no diff at all.
+Conversation sets (peers a user has messages with) are loaded once per connection and kept up to date
+by /ws/chat when a message opens a new conversation. GET /api/v1/presence/ returns the initial state.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.database import SessionLocal
+from app.db.shards import shards
+from app.models.message import Message
+from app.models.presence import UserPresence
+
+logger = logging.getLogger(__name__)
+
+FRAME_PRESENCE = "presence"
+# Rows of workers that stopped refreshing are deleted after this many TTLs
+PURGE_AFTER_TTLS = 3
+# Max user ids per IN (...) when reading remote presence
+IN_BATCH = 5000
+
+Sender = Callable[[dict, int], Awaitable[None]]
+
+
+def load_peers(user_ids: Iterable[int]) -> Dict[int, Set[int]]:
+    """Conversation sets: user_id -> ids of users they have exchanged messages with (all shards). Blocking."""
+    user_ids = set(user_ids)
+    peers: Dict[int, Set[int]] = {u: set() for u in user_ids}
+    if not user_ids:
+        return peers
+    stmt = (
+        select(Message.sender_id, Message.receiver_id)
+        .where(or_(Message.sender_id.in_(user_ids), Message.receiver_id.in_(user_ids)))
+        .distinct()
+    )
+    for shard_engine in shards.engines:
+        db = Session(bind=shard_engine)
+        try:
+            for sender_id, receiver_id in db.execute(stmt):
+                if sender_id in peers:
+                    peers[sender_id].add(receiver_id)
+                if receiver_id in peers:
+                    peers[receiver_id].add(sender_id)
+        finally:
+            db.close()
+    return peers
+
+
+def remote_online(db: Session, worker_id: str, user_ids: Iterable[int], ttl: float) -> Set[int]:
+    """Those of user_ids that a worker other than worker_id has a fresh user_presence row for."""
+    user_ids = list(user_ids)
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    online: Set[int] = set()
+    for i in range(0, len(user_ids), IN_BATCH):
+        online.update(
+            user_id
+            for (user_id,) in db.query(UserPresence.user_id).filter(
+                UserPresence.user_id.in_(user_ids[i:i + IN_BATCH]),
+                UserPresence.worker_id != worker_id,
+                UserPresence.seen_at > cutoff,
+            ).distinct()
+        )
+    return online
+
+
+class PresenceService:
+    def __init__(self, flush_interval: float, offline_grace: float, ttl: float):
+        self.flush_interval = flush_interval
+        self.offline_grace = offline_grace
+        self.ttl = ttl
+        self.worker_id = uuid.uuid4().hex
+        self._connected: Set[int] = set()
+        self._offline_since: Dict[int, float] = {}  # disconnected, still inside the grace period
+        self._stored: Set[int] = set()  # users this worker has rows for in user_presence
+        self._online: Set[int] = set()  # local + watched remote users, as of the last flush (replaced, never mutated)
+        self._peers: Dict[int, Set[int]] = {}  # local user -> conversation set
+        self._watchers: Dict[int, Set[int]] = defaultdict(set)  # peer -> local users that have them
+        self._need_peers: Set[int] = set()
+        self._last_refresh = 0.0
+        self._send: Optional[Sender] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flaps_absorbed = 0
+        self.frames_sent = 0
+
+    # --- fed by ConnectionManager (event loop) ---
+
+    def connected(self, user_id: int) -> None:
+        self._connected.add(user_id)
+        if self._offline_since.pop(user_id, None) is not None:
+            self.flaps_absorbed += 1
+        if user_id not in self._peers:
+            self._need_peers.add(user_id)
+
+    def disconnected(self, user_id: int) -> None:
+        self._connected.discard(user_id)
+        self._offline_since[user_id] = time.monotonic()
+
+    def add_conversation(self, user_a: int, user_b: int) -> None:
+        """A message between two users: make sure each is in the other's conversation set."""
+        for user_id, peer_id in ((user_a, user_b), (user_b, user_a)):
+            peers = self._peers.get(user_id)
+            if peers is not None and peer_id not in peers:
+                peers.add(peer_id)
+                self._watchers[peer_id].add(user_id)
+
+    def _set_peers(self, user_id: int, peers: Set[int]) -> None:
+        self._peers[user_id] = peers
+        for peer_id in peers:
+            self._watchers[peer_id].add(user_id)
+
+    def _drop_peers(self, user_id: int) -> None:
+        for peer_id in self._peers.pop(user_id, ()):
+            watchers = self._watchers.get(peer_id)
+            if watchers is not None:
+                watchers.discard(user_id)
+                if not watchers:
+                    del self._watchers[peer_id]
+
+    # --- flush ---
+
+    def _sync(self, added: Set[int], removed: Set[int], watched: Set[int], need_peers: Set[int],
+              refresh: bool) -> Tuple[Set[int], Dict[int, Set[int]]]:
+        """
+        Write local changes, read which watched users are online on other workers, load new conversation
+        sets. Blocking.
+        """
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            if removed:
+                db.query(UserPresence).filter(
+                    UserPresence.worker_id == self.worker_id, UserPresence.user_id.in_(removed)
+                ).delete(synchronize_session=False)
+            for user_id in added:
+                db.merge(UserPresence(worker_id=self.worker_id, user_id=user_id, seen_at=now))
+            if refresh:
+                db.query(UserPresence).filter(UserPresence.worker_id == self.worker_id).update(
+                    {UserPresence.seen_at: now}, synchronize_session=False
+                )
+                db.query(UserPresence).filter(
+                    UserPresence.seen_at < now - timedelta(seconds=self.ttl * PURGE_AFTER_TTLS)
+                ).delete(synchronize_session=False)
+            db.commit()
+            remote = remote_online(db, self.worker_id, watched, self.ttl) if watched else set()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return remote, load_peers(need_peers)
+
+    async def flush(self) -> None:
+        now = time.monotonic()
+        for user_id in [u for u, t in self._offline_since.items() if now - t >= self.offline_grace]:
+            del self._offline_since[user_id]
+            self._drop_peers(user_id)
+        local = self._connected | set(self._offline_since)
+        need_peers, self._need_peers = self._need_peers, set()
+        refresh = now - self._last_refresh >= self.ttl / 3
+        try:
+            remote, peers = await asyncio.to_thread(
+                self._sync, local - self._stored, self._stored - local, set(self._watchers) - local,
+                need_peers, refresh,
+            )
+        except Exception as e:
+            logger.exception("Presence sync failed, will retry: %s", e)
+            self._need_peers |= need_peers
+            return
+        self._stored = local
+        if refresh:
+            self._last_refresh = now
+        online = local | remote
+        went_online, went_offline = online - self._online, self._online - online
+        self._online = online
+        for user_id, user_peers in peers.items():
+            if user_id in self._connected:
+                self._set_peers(user_id, user_peers)
+        await self._push(went_online, went_offline)
+
+    async def _push(self, went_online: Set[int], went_offline: Set[int]) -> None:
+        """One frame per local user whose conversation set contains a changed user."""
+        if self._send is None:
+            return
+        batches: Dict[int, Tuple[List[int], List[int]]] = {}
+        for changed, index in ((went_online, 0), (went_offline, 1)):
+            for peer_id in changed:
+                for watcher in self._watchers.get(peer_id, ()):
+                    if watcher in self._connected:
+                        batches.setdefault(watcher, ([], []))[index].append(peer_id)
+        for watcher, (online, offline) in batches.items():
+            try:
+                await self._send({"type": FRAME_PRESENCE, "online": online, "offline": offline}, watcher)
+                self.frames_sent += 1
+            except Exception:
+                pass  # socket closing; its disconnect is already on the way
+
+    # --- queries (route handlers, worker threads) ---
+
+    def snapshot(self, user_id: int) -> List[int]:
+        """
+        Online users in user_id's conversation set. Blocking: peers of a locally connected user are watched,
+        so the last flush knows them; otherwise the set and remote presence are read from the DB.
+        """
+        peers = self._peers.get(user_id)
+        if peers is not None:
+            online = self._online | self._connected
+            return sorted(p for p in list(peers) if p in online)
+        peers = load_peers([user_id])[user_id]
+        local = {p for p in peers if p in self._connected or p in self._offline_since}
+        db = SessionLocal()
+        try:
+            remote = remote_online(db, self.worker_id, peers - local, self.ttl)
+        finally:
+            db.close()
+        return sorted(local | remote)
+
+    # --- lifecycle ---
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self, send: Sender) -> None:
+        """Start flushing; send(frame, user_id) delivers a frame to a local user. Call from app startup."""
+        self._send = send
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop flushing and remove this worker's rows, so other workers see its users go offline."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._stored:
+            try:
+                await asyncio.to_thread(self._sync, set(), set(self._stored), set(), set(), False)
+                self._stored = set()
+            except Exception as e:
+                logger.exception("Presence cleanup failed: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "online": len(self._online),
+            "local_online": len(self._connected),
+            "in_grace": len(self._offline_since),
+            "flaps_absorbed": self.flaps_absorbed,
+            "frames_sent": self.frames_sent,
+        }
+
+
+_settings = get_settings()
+presence = PresenceService(
+    flush_interval=_settings.PRESENCE_FLUSH_SECONDS,
+    offline_grace=_settings.PRESENCE_OFFLINE_GRACE_SECONDS,
+    ttl=_settings.PRESENCE_TTL_SECONDS,
+)
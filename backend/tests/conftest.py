@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# Run from backend: python -m pytest tests
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# Importing app modules creates the engine; these tests never connect, so don't require a PostgreSQL driver
+os.environ.setdefault("DATABASE_URL", "sqlite://")
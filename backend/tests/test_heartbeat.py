@@ -0,0 +1,67 @@
+"""Heartbeat timing wheel against many idle simulated sockets (no network, virtual clock)."""
+import asyncio
+
+from app.websocket.heartbeat import IDLE_CLOSE_CODE, PING_FRAME, Heartbeat
+from app.websocket.manager import manager
+
+SOCKETS = 50_000
+KEEP_ALIVE = 25_000
+PING_INTERVAL = 25
+IDLE_TIMEOUT = 60
+
+
+class FakeSocket:
+    __slots__ = ("pings", "close_codes")
+
+    def __init__(self):
+        self.pings = 0
+        self.close_codes = []
+
+    async def send_json(self, data):
+        assert data == PING_FRAME
+        self.pings += 1
+
+    async def close(self, code=1000):
+        self.close_codes.append(code)
+
+
+def test_heartbeat_reaps_idle_and_keeps_active_sockets():
+    hb = Heartbeat(ping_interval=PING_INTERVAL, idle_timeout=IDLE_TIMEOUT, tick_seconds=1)
+    sockets = [FakeSocket() for _ in range(SOCKETS)]
+    # User ids far away from anything else registered with the shared manager
+    user_ids = range(10_000_000, 10_000_000 + SOCKETS)
+    conns = []
+    for user_id, ws in zip(user_ids, sockets):
+        manager.active_connections[user_id] = ws
+        conns.append(hb.register(user_id, ws))
+    base = conns[-1].last_seen
+    for conn in conns:
+        conn.last_seen = base
+    alive, idle = slice(0, KEEP_ALIVE), slice(KEEP_ALIVE, SOCKETS)
+
+    async def run():
+        # 90 virtual seconds, one tick each; the first half sends a frame every 10 s (what touch() records)
+        for second in range(1, 91):
+            now = base + second
+            if second % 10 == 0:
+                for conn in conns[alive]:
+                    conn.last_seen = now
+            await hb.tick(now=now)
+
+    try:
+        asyncio.run(run())
+
+        reaped = SOCKETS - KEEP_ALIVE
+        assert hb.stats() == {"connections": KEEP_ALIVE, "pings_sent": reaped, "reaped_total": reaped}
+        assert all(conn.active for conn in conns[alive])
+        assert all(ws.pings == 0 and not ws.close_codes for ws in sockets[alive])
+        assert all(manager.active_connections.get(u) is ws for u, ws in zip(user_ids[alive], sockets[alive]))
+        # Idle: pinged once after PING_INTERVAL, then closed exactly once after IDLE_TIMEOUT
+        assert not any(conn.active for conn in conns[idle])
+        assert all(ws.pings == 1 and ws.close_codes == [IDLE_CLOSE_CODE] for ws in sockets[idle])
+        assert not any(u in manager.active_connections for u in user_ids[idle])
+        # Reaped connections leave the wheel; live ones stay filed exactly once
+        assert len(hb.wheel) == KEEP_ALIVE
+    finally:
+        for user_id in user_ids:
+            manager.active_connections.pop(user_id, None)
@@ -15,7 +15,7 @@ import ConversationList, {
 } from "@/components/chat/ConversationList";
 import { users, messages, uploadMedia, getMediaUrl, ACCESS_TOKEN_KEY, getWebSocketChatUrl, type UserResponse } from "@/lib/api";
 
-export type ChatMessage = { senderId: number; content: string; isOwn: boolean; mediaUrl?: string | null };
+export type ChatMessage = { id?: number; senderId: number; content: string; isOwn: boolean; mediaUrl?: string | null };
 
 function initials(name: string): string {
   const parts = name.trim().split(/\s+/);
@@ -99,11 +99,19 @@ export default function Dashboard() {
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data as string);
+          // Server heartbeat: reply so the connection is not reaped as idle
+          if (data.type === "ping") {
+            ws.send(JSON.stringify({ type: "pong" }));
+            return;
+          }
+          // Typed frames (typing, read, ...) are ephemeral events, not chat messages
+          if (data.type && data.type !== "message") return;
           if (typeof data.sender_id === "number") {
             const senderKey = String(data.sender_id);
             const content = typeof data.content === "string" ? data.content : "";
             const mediaUrl = typeof data.media_url === "string" ? data.media_url : undefined;
             const newMsg: ChatMessage = {
+              id: typeof data.id === "number" ? data.id : undefined,
               senderId: data.sender_id,
               content,
               isOwn: false,
@@ -111,6 +119,8 @@ export default function Dashboard() {
             };
             setMessagesByUserId((prev) => {
               const existing = prev[senderKey] ?? [];
+              // The server may forward a message again after a sender retry; keep one copy
+              if (newMsg.id !== undefined && existing.some((m) => m.id === newMsg.id)) return prev;
               return {
                 ...prev,
                 [senderKey]: [...existing, newMsg],
@@ -151,6 +161,7 @@ export default function Dashboard() {
         const list = result.data;
         const fromApi: ChatMessage[] = list
           .map((m) => ({
+            id: m.id,
             senderId: m.sender_id,
             content: m.content,
             isOwn: m.sender_id === currentUser.id,
@@ -208,9 +219,11 @@ export default function Dashboard() {
         return;
       }
       const receiverId = Number(selectedId);
-      const payload: { receiver_id: number; message: string; media_url?: string } = {
+      const payload: { receiver_id: number; message: string; media_url?: string; client_msg_id: string } = {
         receiver_id: receiverId,
         message: content || "",
+        // Lets the server ack this message and drop duplicates if it is resent after a reconnect
+        client_msg_id: crypto.randomUUID(),
       };
       if (mediaUrl) payload.media_url = mediaUrl;
       ws.send(JSON.stringify(payload));
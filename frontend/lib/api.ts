@@ -199,10 +199,15 @@ export interface MessageResponse {
 
 export const messages = {
   /** GET /messages/ — list messages for current user (auth required). */
-  list: (params?: { with_user_id?: number; limit?: number }) =>
+  list: (params?: { with_user_id?: number; limit?: number; before_id?: number }) =>
     get<MessageResponse[]>("/messages/", params as Record<string, number>),
 };
 
+export const presence = {
+  /** GET /presence/ — online users among the current user's conversations. Changes arrive as "presence" WS frames. */
+  online: () => get<{ online: number[] }>("/presence/"),
+};
+
 /** Full URL for a media path returned by the API (e.g. /uploads/xxx.jpg). Use for img src. */
 export function getMediaUrl(path: string): string {
   const base = getBaseUrl();
@@ -211,39 +216,38 @@ export function getMediaUrl(path: string): string {
   return `${base}${p}`;
 }
 
-/** Upload an image for chat. Returns { url: "/uploads/xxx.jpg" }. Auth required. */
+interface UploadTicket {
+  key: string;
+  upload_url: string;
+  method: string;
+  headers: Record<string, string>;
+  expires_in: number;
+}
+
+/**
+ * Upload an image for chat. Returns { url } to send as media_url. Auth required.
+ * Bytes go straight to storage via a presigned URL; the API only issues the URL and validates the result.
+ */
 export async function uploadMedia(
   file: File
 ): Promise<{ data: { url: string }; ok: true } | { ok: false; error: ApiError }> {
-  const base = getBaseUrl();
-  if (!base) {
-    return { ok: false, error: { status: 0, message: "Client misconfigured: missing NEXT_PUBLIC_API_URL." } };
-  }
-  const token =
-    typeof window !== "undefined" ? localStorage.getItem(ACCESS_TOKEN_KEY) : null;
-  if (!token) {
-    return { ok: false, error: { status: 401, message: "Not authenticated." } };
-  }
-  const url = `${base}${API_PREFIX}/media/upload`;
-  const form = new FormData();
-  form.append("file", file);
+  const ticket = await post<UploadTicket>("/media/uploads", { content_type: file.type, size: file.size });
+  if (!ticket.ok) return ticket;
+  const { key, upload_url, method, headers } = ticket.data;
+  // S3 returns an absolute URL; the local backend returns a path on this API's host
+  const uploadUrl = /^https?:\/\//.test(upload_url)
+    ? upload_url
+    : `${getBaseUrl().replace(/\/api\/v1\/?$/, "")}${upload_url}`;
   try {
-    const res = await fetch(url, {
-      method: "POST",
-      headers: { Authorization: `Bearer ${token}` },
-      body: form,
-    });
-    const body = await res.json().catch(() => ({}));
+    const res = await fetch(uploadUrl, { method, headers, body: file });
     if (!res.ok) {
-      const message =
-        typeof body?.detail === "string" ? body.detail : res.statusText || "Upload failed";
-      return { ok: false, error: { status: res.status, message, detail: body } };
+      return { ok: false, error: { status: res.status, message: res.statusText || "Upload failed" } };
     }
-    return { ok: true, data: { url: body.url ?? "" } };
   } catch (err) {
     const message = err instanceof Error ? err.message : "Upload failed";
     return { ok: false, error: { status: 0, message } };
   }
+  return post<{ url: string }>(`/media/uploads/${encodeURIComponent(key)}/complete`);
 }
 
 /**